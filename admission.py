@@ -0,0 +1,142 @@
+# admission.py
+"""Admission control and priority-based load shedding.
+
+Each worker tracks how many requests it is serving (in flight) and how long
+recent requests waited in front of it, taken from the ``X-Request-Start``
+header set by the ingress/load balancer. When either signal passes its limit
+the worker answers ``503`` with ``Retry-After`` right away instead of letting
+work pile up until it times out. Low-priority routes (batch scoring,
+feedback) are shed at lower limits than interactive ``/predict``, and probes
+and metrics are never shed.
+
+The in-flight and queue-wait gauges and the admitted/shed counters are meant
+for a custom-metric HorizontalPodAutoscaler (see ``k8s/hpa.yaml``). The shed
+ratio is computed from the counters by Prometheus, so it falls back to zero
+once shedding stops even on a worker that receives no further requests.
+"""
+import threading
+import time
+
+from flask import g, jsonify, request
+from prometheus_client import Counter, Gauge
+
+INTERACTIVE = 'interactive'
+LOW = 'low'
+
+# multiprocess_mode applies when PROMETHEUS_MULTIPROC_DIR is set (gunicorn):
+# in-flight is summed over the pod's workers, the queue wait reports the worst worker
+INFLIGHT_REQUESTS = Gauge(
+    'spam_detector_inflight_requests', 'Requests currently being served by this pod\'s workers',
+    multiprocess_mode='livesum')
+QUEUE_WAIT_SECONDS = Gauge(
+    'spam_detector_queue_wait_seconds', 'Smoothed time requests waited before reaching a worker',
+    multiprocess_mode='livemax')
+ADMITTED_REQUESTS = Counter(
+    'spam_detector_admitted_requests_total', 'Requests admitted by admission control', ['priority'])
+SHED_REQUESTS = Counter(
+    'spam_detector_shed_requests_total', 'Requests rejected by admission control', ['priority'])
+# Export both series from the start, so the shed-ratio query has a zero to divide
+for _priority in (INTERACTIVE, LOW):
+    ADMITTED_REQUESTS.labels(priority=_priority)
+    SHED_REQUESTS.labels(priority=_priority)
+
+
+def parse_request_start(value, now):
+    """Return queue wait in seconds from an ``X-Request-Start`` header value.
+
+    Accepts ``t=<seconds>`` (nginx ``$msec``) as well as bare seconds,
+    milliseconds or microseconds since the epoch.
+    """
+    if not value:
+        return None
+    try:
+        start = float(value.strip().lstrip('t='))
+    except ValueError:
+        return None
+    # Normalize ms/us timestamps to seconds
+    while start > now * 100:
+        start /= 1000.0
+    return max(0.0, now - start)
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=8, max_in_flight_low=4, max_queue_wait=2.0,
+                 max_queue_wait_low=0.5, retry_after=1, smoothing=0.2,
+                 low_priority_paths=('/predict_batch', '/feedback'),
+                 exempt_paths=('/health', '/ready', '/metrics'), exempt_prefixes=('/static/',)):
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_low = max_in_flight_low
+        self.max_queue_wait = max_queue_wait
+        self.max_queue_wait_low = max_queue_wait_low
+        self.retry_after = retry_after
+        self.smoothing = smoothing
+        self.low_priority_paths = frozenset(low_priority_paths)
+        self.exempt_paths = frozenset(exempt_paths)
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queue_wait = 0.0
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def queue_wait(self):
+        return self._queue_wait
+
+    def priority(self, path):
+        if path in self.exempt_paths or path.startswith(self.exempt_prefixes):
+            return None
+        return LOW if path in self.low_priority_paths else INTERACTIVE
+
+    def admit(self, priority, wait=None):
+        """Decide whether to serve a request; returns True if admitted."""
+        with self._lock:
+            if wait is not None:
+                self._queue_wait += self.smoothing * (wait - self._queue_wait)
+                QUEUE_WAIT_SECONDS.set(self._queue_wait)
+
+            if priority == LOW:
+                limit, wait_limit = self.max_in_flight_low, self.max_queue_wait_low
+            else:
+                limit, wait_limit = self.max_in_flight, self.max_queue_wait
+            shed = self._in_flight >= limit or self._queue_wait > wait_limit
+
+            if not shed:
+                self._in_flight += 1
+                INFLIGHT_REQUESTS.set(self._in_flight)
+
+        if shed:
+            SHED_REQUESTS.labels(priority=priority).inc()
+        else:
+            ADMITTED_REQUESTS.labels(priority=priority).inc()
+        return not shed
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            INFLIGHT_REQUESTS.set(self._in_flight)
+
+    def _before_request(self):
+        priority = self.priority(request.path)
+        if priority is None:
+            return None
+
+        wait = parse_request_start(request.headers.get('X-Request-Start'), time.time())
+        if not self.admit(priority, wait):
+            response = jsonify({'error': 'Server overloaded, please retry shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(self.retry_after)
+            return response
+        g.admission_admitted = True
+        return None
+
+    def _teardown_request(self, exc=None):
+        if g.pop('admission_admitted', False):
+            self.release()
@@ -1,17 +1,34 @@
 # app.py
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
-from model import SpamDetector # Assuming SpamDetector is in model.py
+from flask import Flask, Response, g, request, jsonify, render_template, redirect, url_for, flash
+from model import DEFAULT_EXPLAIN_TOP_K, SpamDetector # Assuming SpamDetector is in model.py
+from email_ingest import iter_email_file, parse_message_bytes, predict_stream
+from campaign_index import CampaignIndex
+from cascade import Cascade, load_second_stage
+from prefilter import RulePrefilter
+from model_manager import ModelManager, ModelNotFound
+from corpus import ensure_corpus
 import os
 import pandas as pd
 import tempfile # For handling file uploads securely
 import logging
 
+import hmac
+import itertools
+import json
 import logging
 import time
 from datetime import datetime
-from functools import wraps
-import redis
+from functools import partial, wraps
+from redis_resilience import ResilientRedis
+from admission import AdmissionController
+from live_metrics import LiveMetrics, LiveMetricsStream
+from drift_monitor import DriftMonitor
+from profiling import UNMATCHED, MemoryTracer, ProfilerBusy, RouteTimings, SamplingProfiler, collapsed
+from response_formats import (UnsupportedFormat, negotiate_encoding, negotiate_format,
+                              parse_bool, render_results, stream_results, vary, STREAMING_FORMATS)
+from prometheus_client import Counter, Histogram
 from prometheus_flask_exporter import PrometheusMetrics
+from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
 import psutil
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -40,24 +57,159 @@ app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))
 # Handle proxy headers for proper IP detection
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
-# Initialize Prometheus metrics
-metrics = PrometheusMetrics(app)
+# Initialize Prometheus metrics. Under gunicorn (PROMETHEUS_MULTIPROC_DIR set,
+# see gunicorn.conf.py) /metrics aggregates every worker of the pod instead of
+# whichever worker happened to take the scrape.
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    metrics = GunicornInternalPrometheusMetrics(app)
+else:
+    metrics = PrometheusMetrics(app)
 metrics.info('app_info', 'Application info', version='1.0.0')
 
-# Redis connection for caching
-try:
-    redis_client = redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
-    redis_client.ping()
+# /predict metrics
+PREDICTIONS = Counter('spam_detector_predictions_total', 'Messages classified by /predict', ['prediction'])
+PREDICTION_ERRORS = Counter('spam_detector_prediction_errors_total', 'Failed /predict requests')
+PREDICTION_DURATION = Histogram('spam_detector_prediction_duration_seconds', 'Time spent serving /predict')
+PREDICTION_CACHE = Counter('spam_detector_prediction_cache_total', 'Prediction cache lookups', ['result'])
+
+# Admission control: shed low-priority work (/predict_batch, /feedback) first,
+# then interactive /predict, with 503 + Retry-After. /health, /ready and
+# /metrics are always served. Limits are per worker process.
+admission = AdmissionController(
+    max_in_flight=int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 8)),
+    max_in_flight_low=int(os.environ.get('ADMISSION_MAX_IN_FLIGHT_LOW', 4)),
+    max_queue_wait=float(os.environ.get('ADMISSION_MAX_QUEUE_WAIT', 2.0)),
+    max_queue_wait_low=float(os.environ.get('ADMISSION_MAX_QUEUE_WAIT_LOW', 0.5)),
+    retry_after=int(os.environ.get('ADMISSION_RETRY_AFTER', 1)),
+    # Long-lived dashboard streams are capped separately by LiveMetricsStream
+    exempt_paths=('/health', '/ready', '/metrics', '/api/metrics/stream'),
+    # Admin endpoints must stay reachable on an overloaded worker
+    exempt_prefixes=('/static/', '/admin/'),
+)
+admission.init_app(app)
+
+# Rolling-window throughput/latency/cache metrics for the dashboard, pushed to
+# all open dashboards from one shared Server-Sent Events publisher
+LIVE_METRICS_ENDPOINTS = {'predict_message', 'api_predict', 'predict_batch'}
+# Under gunicorn every worker's window is merged through PROMETHEUS_MULTIPROC_DIR,
+# so a stream shows the whole pod whichever worker serves it
+LIVE_METRICS_SHARED_DIR = (os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], 'live')
+                           if os.environ.get('PROMETHEUS_MULTIPROC_DIR') else None)
+live_metrics = LiveMetrics(window=int(os.environ.get('LIVE_METRICS_WINDOW', 60)),
+                           shared_dir=LIVE_METRICS_SHARED_DIR)
+# Every open stream holds one of the worker's GUNICORN_THREADS threads and is
+# exempt from admission control, so only a small share may go to dashboards.
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+LIVE_METRICS_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_METRICS_MAX_SUBSCRIBERS', max(1, GUNICORN_THREADS // 4)))
+live_metrics_stream = LiveMetricsStream(
+    live_metrics, interval=float(os.environ.get('LIVE_METRICS_INTERVAL', 2.0)),
+    max_subscribers=LIVE_METRICS_MAX_SUBSCRIBERS)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_live_metrics(response):
+    if request.endpoint in LIVE_METRICS_ENDPOINTS and 'request_start' in g:
+        live_metrics.record(time.perf_counter() - g.request_start, g.get('cache_hit'))
+    return response
+
+# Admin-only profiling (see profiling.py). The /admin/ routes answer 404
+# unless ADMIN_TOKEN is set; everything is idle until used. CPU profiles and
+# route timings are per worker process. Memory tracing is toggled for every
+# worker through PROMETHEUS_MULTIPROC_DIR under gunicorn.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 30))
+PROFILE_SHARED_DIR = (os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], 'profile')
+                      if os.environ.get('PROMETHEUS_MULTIPROC_DIR') else None)
+profiler = SamplingProfiler(max_duration=PROFILE_MAX_SECONDS)
+memory_tracer = MemoryTracer(shared_dir=PROFILE_SHARED_DIR)
+route_timings = RouteTimings()
+
+@app.before_request
+def poll_memory_tracing():
+    memory_tracer.ensure_polling()
+
+@app.after_request
+def record_route_timing(response):
+    if route_timings.enabled and 'request_start' in g:
+        route_timings.record(request.endpoint or UNMATCHED, time.perf_counter() - g.request_start)
+    return response
+
+# Redis connection for caching and rate limiting. Calls fail open (skip the
+# cache/limit) while the circuit breaker is open, and reconnect in background.
+redis_client = ResilientRedis.from_env()
+if redis_client.available:
     logger.info("Redis connection established")
-except:
-    redis_client = None
-    logger.warning("Redis not available, caching disabled")
+else:
+    logger.warning("Redis not available, caching disabled until it becomes reachable")
+
+# Near-duplicate campaign index settings
+CAMPAIGN_INDEX_ENABLED = os.environ.get('CAMPAIGN_INDEX_ENABLED', 'true').lower() == 'true'
+CAMPAIGN_INDEX_TTL = int(os.environ.get('CAMPAIGN_INDEX_TTL', 3600))
+CAMPAIGN_INDEX_MAX_ENTRIES = int(os.environ.get('CAMPAIGN_INDEX_MAX_ENTRIES', 50000))
+
+# Cascade settings: uncertain NB verdicts (spam probability within the band)
+# are re-scored by the second-stage model at CASCADE_MODEL_PATH, if set
+CASCADE_MODEL_PATH = os.environ.get('CASCADE_MODEL_PATH')
+CASCADE_LOW = float(os.environ.get('CASCADE_LOW', 0.2))
+CASCADE_HIGH = float(os.environ.get('CASCADE_HIGH', 0.8))
+CASCADE_BATCH_SIZE = int(os.environ.get('CASCADE_BATCH_SIZE', 32))
+CASCADE_WORKERS = int(os.environ.get('CASCADE_WORKERS', 1))
+CASCADE_TIMEOUT = float(os.environ.get('CASCADE_TIMEOUT', 5.0))
+
+def load_cascade():
+    if not CASCADE_MODEL_PATH:
+        return None
+    try:
+        second_stage = load_second_stage(CASCADE_MODEL_PATH, num_threads=CASCADE_WORKERS)
+        logger.info(f"Cascade second stage loaded from {CASCADE_MODEL_PATH}")
+    except Exception as e:
+        logger.warning(f"Could not load cascade model from {CASCADE_MODEL_PATH}, cascade disabled: {e}")
+        return None
+    return Cascade(second_stage, low=CASCADE_LOW, high=CASCADE_HIGH,
+                   batch_size=CASCADE_BATCH_SIZE, max_workers=CASCADE_WORKERS,
+                   timeout=CASCADE_TIMEOUT)
+
+cascade = load_cascade()
+
+# Signature prefilter (hot-reloaded when the rules file changes)
+PREFILTER_RULES_PATH = os.environ.get('PREFILTER_RULES_PATH', 'rules/prefilter_rules.json')
+PREFILTER_RELOAD_INTERVAL = float(os.environ.get('PREFILTER_RELOAD_INTERVAL', 5.0))
+
+def load_prefilter():
+    if not PREFILTER_RULES_PATH or not os.path.exists(PREFILTER_RULES_PATH):
+        return None
+    try:
+        return RulePrefilter(PREFILTER_RULES_PATH, reload_interval=PREFILTER_RELOAD_INTERVAL)
+    except Exception as e:
+        logger.warning(f"Could not load prefilter rules from {PREFILTER_RULES_PATH}, prefilter disabled: {e}")
+        return None
+
+prefilter = load_prefilter()
+
+def configure_detector(spam_detector, campaign_index=True):
+    """Attach the optional scoring stages configured for this deployment."""
+    if campaign_index and CAMPAIGN_INDEX_ENABLED:
+        spam_detector.campaign_index = CampaignIndex(
+            ttl=CAMPAIGN_INDEX_TTL, max_entries=CAMPAIGN_INDEX_MAX_ENTRIES)
+    spam_detector.cascade = cascade
+    spam_detector.prefilter = prefilter
+    return spam_detector
 
-detector = SpamDetector()
+detector = configure_detector(SpamDetector())
 
 # Path to pre-trained model and feedback file
 MODEL_PATH = "model"
 FEEDBACK_FILE = "feedback_data.csv" # For storing user feedback
+# Deduplicated, memory-mapped training snapshot of the dataset + feedback (see corpus.py)
+CORPUS_DIR = os.environ.get('CORPUS_DIR', 'corpus')
+# Longest message accepted by /predict. Feature extraction is capped separately
+# (see model.MAX_FEATURE_CHARS), so long emails are accepted but scored cheaply.
+MAX_MESSAGE_LENGTH = int(os.environ.get('MAX_MESSAGE_LENGTH', 100000))
+# Largest top_k accepted for explained predictions
+MAX_EXPLAIN_TOP_K = 50
 
 # Initialize or load model
 def initialize_model():
@@ -73,23 +225,89 @@ def initialize_model():
                 print("spam_dataset.csv not found. Creating a dummy dataset.")
                 dummy_data = {
                     'v1': ['ham', 'spam'] * 50, # Ensure enough samples for stratification
-                    'v2': ['This is a ham message.', 'This is a spam message. Click here!'] * 50
+                    # Distinct texts, since the corpus build drops duplicates
+                    'v2': [f'This is ham message {i}.' if i % 2 == 0 else f'This is spam message {i}. Click here!'
+                           for i in range(100)]
                 }
                 pd.DataFrame(dummy_data).to_csv("spam_dataset.csv", index=False, encoding='utf-8')
                 print("Dummy spam_dataset.csv created.")
             
-            accuracy, report = detector.train("spam_dataset.csv")
+            corpus = ensure_corpus("spam_dataset.csv", FEEDBACK_FILE, CORPUS_DIR)
+            accuracy, report = detector.train(corpus.path)
             detector.save_model(MODEL_PATH)
             print(f"New model trained with accuracy: {accuracy}")
             print("Classification Report:\\n", report)
     except Exception as e:
         print(f"Error during model initialization or training: {e}")
         # Fallback: re-initialize detector to prevent app crash if training fails
-        detector = SpamDetector() 
+        detector = configure_detector(SpamDetector())
         print("Fell back to an untrained SpamDetector instance due to error.")
 
 initialize_model() # Load or train the model when the app starts
 
+# Per-tenant / per-channel models, selected with a "model" field or the
+# X-Model-Key header (e.g. "sms/en" -> MODEL_ROOT/sms/en/). They are loaded on
+# first use and evicted least-recently-used once MODEL_CACHE_MAX_BYTES is exceeded.
+MODEL_ROOT = os.environ.get('MODEL_ROOT', 'models')
+MODEL_CACHE_MAX_BYTES = int(os.environ.get('MODEL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+def load_tenant_model(path):
+    # No campaign index: one per tenant would hold up to CAMPAIGN_INDEX_MAX_ENTRIES
+    # entries outside the MODEL_CACHE_MAX_BYTES budget, and a shared one would
+    # hand one tenant's verdicts to another tenant's messages
+    tenant_detector = configure_detector(SpamDetector(), campaign_index=False)
+    tenant_detector.load_model(path)
+    return tenant_detector
+
+model_manager = ModelManager(MODEL_ROOT, MODEL_CACHE_MAX_BYTES, load_tenant_model)
+
+# Streaming drift / quality signals for the default model, exported at /metrics
+# as spam_detector_drift_* with alert thresholds (see monitoring/rules/drift.yml)
+drift_monitor = DriftMonitor(
+    window=int(os.environ.get('DRIFT_WINDOW', 3600)),
+    reference_size=int(os.environ.get('DRIFT_REFERENCE_SIZE', 5000)),
+    token_sample_rate=float(os.environ.get('DRIFT_TOKEN_SAMPLE_RATE', 0.1)),
+    thresholds={
+        'probability_psi': float(os.environ.get('DRIFT_PSI_THRESHOLD', 0.2)),
+        'spam_rate_shift': float(os.environ.get('DRIFT_SPAM_RATE_THRESHOLD', 0.15)),
+        'unseen_token_rate': float(os.environ.get('DRIFT_UNSEEN_TOKEN_THRESHOLD', 0.3)),
+        'feedback_disagreement_rate': float(os.environ.get('DRIFT_DISAGREEMENT_THRESHOLD', 0.2)),
+    },
+)
+
+def record_drift(model, results):
+    """Feed verdicts served by the default model to the drift monitor."""
+    if model is not detector:
+        return
+    try:
+        drift_monitor.observe(results, model.vectorizer)
+    except Exception as e:
+        logger.warning(f"Drift monitor update failed: {e}")
+
+def select_detector(data=None):
+    """Return ``(model_key, detector, error_response)`` for the current request."""
+    model_key = (data or {}).get('model') or request.values.get('model') or request.headers.get('X-Model-Key')
+    if not model_key:
+        return None, detector, None
+    try:
+        return model_key, model_manager.get(model_key), None
+    except ValueError as e:
+        return model_key, None, (jsonify({'error': str(e)}), 400)
+    except ModelNotFound:
+        return model_key, None, (jsonify({'error': f"Unknown model '{model_key}'"}), 404)
+
+def parse_explain_options(data):
+    """Return ``(explain, top_k)`` from the JSON body or query string."""
+    explain = parse_bool(data.get('explain', request.args.get('explain')), default=False)
+    top_k = data.get('top_k', request.args.get('top_k', DEFAULT_EXPLAIN_TOP_K))
+    try:
+        top_k = int(top_k)
+    except (TypeError, ValueError):
+        raise ValueError('top_k must be an integer')
+    if not 1 <= top_k <= MAX_EXPLAIN_TOP_K:
+        raise ValueError(f'top_k must be between 1 and {MAX_EXPLAIN_TOP_K}')
+    return explain, top_k
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -99,7 +317,7 @@ def rate_limit(max_requests=100, window=60):
     def decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            if redis_client:
+            if redis_client.available:
                 client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
                 key = f"rate_limit:{client_ip}:{f.__name__}"
                 
@@ -124,13 +342,10 @@ def health_check():
         
         # Check Redis connection
         redis_status = "healthy"
-        if redis_client:
-            try:
-                redis_client.ping()
-            except:
-                redis_status = "unhealthy"
-        else:
-            redis_status = "disabled"
+        if not redis_client.available:
+            redis_status = f"circuit_{redis_client.state}"
+        elif not redis_client.ping():
+            redis_status = "unhealthy"
         
         # Check system resources
         memory_usage = psutil.virtual_memory().percent
@@ -170,6 +385,23 @@ def readiness_check():
     else:
         return jsonify({'status': 'not_ready', 'reason': 'model_not_trained'}), 503
 
+@app.route('/api/metrics/stream')
+def live_metrics_events():
+    """Server-Sent Events stream of live dashboard metrics."""
+    if not live_metrics_stream.subscribe():
+        response = jsonify({'error': 'Too many live metric streams on this worker'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    response = Response(live_metrics_stream.events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Released when the server closes the response, also for HEAD, whose body is never read
+    response.call_on_close(live_metrics_stream.release)
+    return response
+
+# Set by the prefilter, campaign index and cascade when they decide a message
+VERDICT_FIELDS = ('rule_id', 'campaign_id', 'campaign_size', 'campaign_hit', 'stage')
+
 @app.route('/predict', methods=['POST'])
 @rate_limit(max_requests=50, window=60)
 def predict_message():
@@ -186,53 +418,95 @@ def predict_message():
         if not message:
             return jsonify({'error': 'No message provided'}), 400
             
-        if len(message) > 1000:  # Limit message length
-            return jsonify({'error': 'Message too long (max 1000 characters)'}), 400
+        if len(message) > MAX_MESSAGE_LENGTH:  # Limit message length
+            return jsonify({'error': f'Message too long (max {MAX_MESSAGE_LENGTH} characters)'}), 400
+
+        # Raw RFC 822 emails are reduced to normalized subject + body text
+        if data.get('format') == 'email':
+            message = parse_message_bytes(message)
+            if not message:
+                return jsonify({'error': 'No text content found in email'}), 400
         
-        # Check cache first
-        cache_key = f"prediction:{hash(message)}"
-        if redis_client:
+        model_key, model, error = select_detector(data)
+        if error:
+            return error
+        try:
+            explain, top_k = parse_explain_options(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Check cache first (explained results are not cached)
+        cache_key = f"prediction:{model_key or 'default'}:{hash(message)}"
+        if redis_client.available and not explain:
             cached_result = redis_client.get(cache_key)
+            g.cache_hit = bool(cached_result)
             if cached_result:
                 logger.info(f"Cache hit for message hash: {hash(message)}")
-                metrics.counter('cache_hits_total').inc()
-                return jsonify(eval(cached_result))
+                PREDICTION_CACHE.labels(result='hit').inc()
+                return jsonify(json.loads(cached_result))
         
         # Make prediction
-        result = detector.predict(message)
-        
-        # Cache result
-        if redis_client and result:
-            redis_client.setex(cache_key, 300, str(result[0]))  # Cache for 5 minutes
-            metrics.counter('cache_misses_total').inc()
+        result = model.predict(message, explain=explain, top_k=top_k)
+        record_drift(model, result)
         
         # Log prediction
         processing_time = time.time() - start_time
-        logger.info(f"Prediction made: {result[0]['prediction']} (confidence: {result[0]['probability']:.2f}) in {processing_time:.3f}s")
+        logger.info(f"Prediction made: {result['prediction']} (confidence: {result['spam_probability']:.2f}) in {processing_time:.3f}s")
         
         # Record metrics
-        metrics.histogram('prediction_duration_seconds').observe(processing_time)
-        metrics.counter('predictions_total', labels={'prediction': result[0]['prediction']}).inc()
+        PREDICTION_DURATION.observe(processing_time)
+        PREDICTIONS.labels(prediction=result['prediction']).inc()
         
-        return jsonify({
+        response = {
             'text': message,
-            'prediction': result[0]['prediction'],
-            'is_spam': result[0]['is_spam'],
-            'spam_probability': result[0]['probability'],
+            'prediction': result['prediction'],
+            'is_spam': result['is_spam'],
+            'spam_probability': result['spam_probability'],
             'processing_time': processing_time
-        })
+        }
+        response.update((field, result[field]) for field in VERDICT_FIELDS if field in result)
+
+        # Cache result
+        if redis_client.available and not explain:
+            redis_client.setex(cache_key, 300, json.dumps(response))  # Cache for 5 minutes
+            PREDICTION_CACHE.labels(result='miss').inc()
+
+        if explain:
+            response['explanation'] = result.get('explanation', [])
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Prediction error: {e}")
-        metrics.counter('prediction_errors_total').inc()
+        PREDICTION_ERRORS.inc()
         return jsonify({'error': 'Internal server error'}), 500
 
+def remove_temp_file(temp_path):
+    if not os.path.exists(temp_path):
+        return
+    try:
+        os.remove(temp_path)
+        app.logger.info(f"Successfully removed temp file: {temp_path}")
+    except Exception as e_remove:
+        app.logger.error(f"Error removing temp file {temp_path}: {e_remove}")
+
 @app.route('/predict_batch', methods=['POST'])
 def predict_batch():
     messages = []  # Initialize messages
     temp_path = None # Initialize temp_path for cleanup
     file_uploaded = False
 
+    # Response shape: ?format=json|columnar|ndjson|msgpack|arrow (or Accept),
+    # include_text=false to skip echoing inputs, compressed per Accept-Encoding
+    try:
+        response_format = negotiate_format(request)
+    except UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 406
+    include_text = parse_bool(request.values.get('include_text'))
+    content_encoding = negotiate_encoding(request)
+    _, model, error = select_detector()
+    if error:
+        return error
+
     if 'file' in request.files and request.files['file'].filename != '':
         file = request.files['file']
         file_uploaded = True
@@ -296,20 +570,36 @@ def predict_batch():
                 if not read_success and not messages: # If all encodings failed and messages is still empty
                     app.logger.error(f"Could not read TXT file '{file.filename}' or it is empty.")
                     return jsonify({'error': f"Could not read TXT file '{file.filename}'. It might be empty or use an unsupported encoding."}), 500
+            elif file.filename.lower().endswith(('.eml', '.mbox')):
+                # Emails are parsed, scored and written out in bounded batches
+                # straight from the temp file, so memory stays constant however
+                # large the mailbox; only row-wise formats can be written that way
+                if response_format not in STREAMING_FORMATS:
+                    return jsonify({'error': f"Email uploads are streamed; use format "
+                                             f"{' or '.join(STREAMING_FORMATS)}"}), 406
+                results = predict_stream(model, iter_email_file(temp_path),
+                                         on_batch=lambda batch: record_drift(model, batch))
+                first = next(results, None)
+                if first is None:
+                    app.logger.warning(f"No messages found in email file '{file.filename}'.")
+                    return jsonify({'error': 'No messages found in the email file.'}), 400
+                app.logger.info(f"Streaming predictions for email file '{file.filename}'.")
+                response = stream_results(itertools.chain([first], results), response_format,
+                                          include_text, content_encoding)
+                # The body is read from the temp file while it is sent; remove it afterwards
+                response.call_on_close(partial(remove_temp_file, temp_path))
+                temp_path = None
+                return response
             else:
                 app.logger.warning(f"Unsupported file type uploaded: {file.filename}")
-                return jsonify({'error': 'Unsupported file type. Please upload .csv or .txt'}), 400
+                return jsonify({'error': 'Unsupported file type. Please upload .csv, .txt, .eml or .mbox'}), 400
         
         except Exception as e:
             app.logger.error(f"File processing error for '{file.filename if file else 'N/A'}': {e}", exc_info=True)
             return jsonify({'error': f'Error processing file: {str(e)}'}), 500
         finally:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                    app.logger.info(f"Successfully removed temp file: {temp_path}")
-                except Exception as e_remove:
-                    app.logger.error(f"Error removing temp file {temp_path}: {e_remove}")
+            if temp_path:
+                remove_temp_file(temp_path)
     
     # This branch handles pasted text if no file was uploaded or if file upload was skipped
     if not file_uploaded:
@@ -328,8 +618,9 @@ def predict_batch():
         
     try:
         app.logger.info(f"Predicting for {len(messages)} messages.")
-        results = detector.predict(messages) 
-        return jsonify(results)
+        results = model.predict(messages)
+        record_drift(model, results)
+        return render_results(results, response_format, include_text, content_encoding)
     except Exception as e:
         app.logger.error(f"Batch prediction error: {e}", exc_info=True)
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
@@ -379,6 +670,7 @@ def handle_feedback():
             feedback_df.to_csv(FEEDBACK_FILE, mode='w', header=True, index=False, encoding='utf-8')
         
         app.logger.info(f"Feedback stored successfully for message: {message[:50]}...")
+        drift_monitor.observe_feedback(predicted_label_str == 'Spam', str(actual_label).lower() == 'spam')
         return jsonify({'status': 'success', 'message': 'Feedback received. Thank you!'})
     except Exception as e:
         app.logger.error(f"Feedback storage error: {e}", exc_info=True)
@@ -418,6 +710,20 @@ def api_predict():
         return jsonify({'error': 'No message provided in JSON payload'}), 400
     
     message = data['message']
+
+    try:
+        response_format = negotiate_format(request)
+    except UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 406
+    include_text = parse_bool(data.get('include_text', request.args.get('include_text')))
+    content_encoding = negotiate_encoding(request)
+    _, model, error = select_detector(data)
+    if error:
+        return error
+    try:
+        explain, top_k = parse_explain_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
         # detector.predict returns a dict for single message, or list for multiple
@@ -426,18 +732,93 @@ def api_predict():
             if not message:
                  return jsonify({'error': 'Empty list of messages provided'}), 400
             # result = detector.predict(message) # Or handle as batch if API spec allows
-            result = detector.predict(message[0]) # Predict first message if list
+            result = model.predict(message[0], explain=explain, top_k=top_k) # Predict first message if list
             result['note'] = "API processed the first message from the list."
         elif isinstance(message, str):
-            result = detector.predict(message)
+            result = model.predict(message, explain=explain, top_k=top_k)
         else:
             return jsonify({'error': 'Message must be a string or a list of strings.'}), 400
-            
-        return jsonify(result)
+        record_drift(model, result)
+
+        if response_format != 'json':
+            return render_results([result], response_format, include_text, content_encoding)
+        if not include_text:
+            result.pop('text', None)
+        response = jsonify(result)
+        response.headers['Vary'] = vary(1)
+        return response
     except Exception as e:
         app.logger.error(f"API Prediction error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def require_admin(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Not found'}), 404
+        supplied = request.headers.get('X-Admin-Token', '')
+        auth = request.headers.get('Authorization', '')
+        if auth.startswith('Bearer '):
+            supplied = auth[len('Bearer '):]
+        if not hmac.compare_digest(supplied.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/profile/cpu', methods=['POST'])
+@require_admin
+def profile_cpu():
+    """Sample this worker for ?seconds=N; collapsed stacks (default) or JSON."""
+    try:
+        seconds = float(request.args.get('seconds', 5))
+    except ValueError:
+        return jsonify({'error': 'seconds must be a number'}), 400
+    try:
+        profile = profiler.profile(seconds, include_idle=parse_bool(request.args.get('idle'), default=False))
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    if request.args.get('format') == 'json':
+        return jsonify(profile)
+    return Response(collapsed(profile), mimetype='text/plain',
+                    headers={'X-Worker-Pid': str(profile['pid']), 'X-Profile-Samples': str(profile['samples'])})
+
+@app.route('/admin/profile/memory/start', methods=['POST'])
+@require_admin
+def start_memory_tracing():
+    started = memory_tracer.start()
+    return jsonify({'pid': os.getpid(), 'tracing': True, 'started': started})
+
+@app.route('/admin/profile/memory/stop', methods=['POST'])
+@require_admin
+def stop_memory_tracing():
+    stopped = memory_tracer.stop()
+    return jsonify({'pid': os.getpid(), 'tracing': False, 'stopped': stopped})
+
+@app.route('/admin/profile/memory/snapshot', methods=['GET'])
+@require_admin
+def memory_snapshot():
+    """Top allocation sites of every worker; after the first call, growth since the previous snapshot."""
+    key_type = request.args.get('key', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': "key must be 'lineno', 'filename' or 'traceback'"}), 400
+    try:
+        top = int(request.args.get('top', 25))
+        return jsonify({'workers': memory_tracer.collect(key_type, top=top)})
+    except ValueError:
+        return jsonify({'error': 'top must be an integer'}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/admin/profile/routes', methods=['GET', 'POST', 'DELETE'])
+@require_admin
+def route_timing_report():
+    """POST starts per-route timing, DELETE stops it, GET returns the aggregates."""
+    if request.method == 'POST':
+        route_timings.enable()
+    elif request.method == 'DELETE':
+        route_timings.disable()
+    return jsonify(route_timings.report())
+
 if __name__ == '__main__':
     # Ensure the 'model' directory exists
     os.makedirs(MODEL_PATH, exist_ok=True)
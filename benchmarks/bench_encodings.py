@@ -0,0 +1,80 @@
+# benchmarks/bench_encodings.py
+"""Serialization CPU time and bytes-on-wire per message for batch responses.
+
+Compares today's row-wise ``jsonify`` output against every format and
+compression supported by response_formats.py on synthetic results shaped
+like ``SpamDetector.predict`` output.
+
+    python benchmarks/bench_encodings.py [rows]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask, jsonify
+
+import response_formats
+from response_formats import available_formats, encode
+
+SAMPLE_TEXTS = [
+    "Go until jurong point, crazy.. Available only in bugis n great world la e buffet... Cine there got amore wat...",
+    "Free entry in 2 a wkly comp to win FA Cup final tkts 21st May 2005. Text FA to 87121 to receive entry question(std txt rate)T&C's apply 08452810075over18's",
+    "U dun say so early hor... U c already then say...",
+    "WINNER!! As a valued network customer you have been selected to receivea £900 prize reward! To claim call 09061701461. Claim code KL341. Valid 12 hours only.",
+    "Nah I don't think he goes to usf, he lives around here though",
+]
+
+
+def make_results(rows, seed=42):
+    rng = random.Random(seed)
+    results = []
+    for _ in range(rows):
+        spam = round(rng.random() * 100, 2)
+        results.append({
+            'text': rng.choice(SAMPLE_TEXTS),
+            'is_spam': spam >= 50,
+            'spam_probability': spam,
+            'ham_probability': round(100 - spam, 2),
+            'prediction': 'Spam' if spam >= 50 else 'Not Spam'
+        })
+    return results
+
+
+def measure(fn, repeat=3):
+    best_cpu, size = None, 0
+    for _ in range(repeat):
+        start = time.process_time()
+        size = fn()
+        elapsed = time.process_time() - start
+        best_cpu = elapsed if best_cpu is None else min(best_cpu, elapsed)
+    return best_cpu, size
+
+
+def main(rows=100000):
+    results = make_results(rows)
+    app = Flask(__name__)
+    encodings = [None, 'gzip'] + (['zstd'] if response_formats.zstandard is not None else [])
+
+    def baseline():
+        with app.app_context():
+            return len(jsonify(results).get_data())
+
+    print(f"{rows} results")
+    print(f"{'format':<10} {'text':<5} {'encoding':<8} {'cpu ms':>9} {'bytes/msg':>10} {'vs baseline':>12}")
+    base_cpu, base_size = measure(baseline)
+    print(f"{'jsonify':<10} {'yes':<5} {'-':<8} {base_cpu * 1000:9.1f} {base_size / rows:10.1f} {'1.00x':>12}")
+
+    for fmt in available_formats():
+        for include_text in (True, False):
+            for encoding in encodings:
+                cpu, size = measure(
+                    lambda: sum(len(c) for c in encode(results, fmt, include_text, encoding)))
+                print(f"{fmt:<10} {'yes' if include_text else 'no':<5} {encoding or '-':<8} "
+                      f"{cpu * 1000:9.1f} {size / rows:10.1f} {base_size / size:11.2f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,68 @@
+# benchmarks/bench_explain.py
+"""Cost of prediction explanations relative to scoring.
+
+Trains the default TF-IDF + NB model on spam_dataset.csv and times
+``SpamDetector._score`` with and without ``explain_top_k``, for single
+messages (the /predict and /api/predict case) and for one large batch.
+
+Plain and explained calls are interleaved after a warm-up and the median of
+many samples is reported, so machine noise hits both sides alike. A single
+pass is too noisy to read the single-message overhead against a call of
+over a millisecond.
+
+    python benchmarks/bench_explain.py [messages]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model import DEFAULT_EXPLAIN_TOP_K, SpamDetector, load_dataset
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'spam_dataset.csv')
+SINGLE_MESSAGES = 200
+SINGLE_PASSES = 5
+BATCH_REPEAT = 15
+
+
+def interleaved_medians(plain, explained, inputs):
+    """Median seconds of ``plain(x)`` and ``explained(x)``, alternating over ``inputs``."""
+    plain(inputs[0])
+    explained(inputs[0])  # warm-up
+    timings = ([], [])
+    for x in inputs:
+        for fn, out in ((plain, timings[0]), (explained, timings[1])):
+            start = time.perf_counter()
+            fn(x)
+            out.append(time.perf_counter() - start)
+    return statistics.median(timings[0]), statistics.median(timings[1])
+
+
+def main(count=2000):
+    detector = SpamDetector()
+    detector.train(DATA_PATH)
+    messages = load_dataset(DATA_PATH)['v2'].tolist()[:count]
+    top_k = DEFAULT_EXPLAIN_TOP_K
+
+    def plain(batch):
+        detector._score(batch)
+
+    def explained(batch):
+        detector._score(batch, explain_top_k=top_k)
+
+    print(f"{len(messages)} messages, top_k={top_k}")
+    print(f"{'mode':<8} {'score us/msg':>13} {'explain us/msg':>15} {'overhead':>9}")
+    runs = (
+        ('single', [[m] for m in messages[:SINGLE_MESSAGES]] * SINGLE_PASSES, 1),
+        ('batch', [messages] * BATCH_REPEAT, len(messages)),
+    )
+    for mode, inputs, per in runs:
+        base, with_explain = interleaved_medians(plain, explained, inputs)
+        print(f"{mode:<8} {base / per * 1e6:13.1f} "
+              f"{(with_explain - base) / per * 1e6:15.1f} {(with_explain - base) / base:9.1%}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,231 @@
+# campaign_index.py
+"""In-memory MinHash/LSH index of recently scored messages.
+
+Spam arrives in waves of near-identical texts that only differ in phone
+numbers, claim codes or amounts. Each scored message is reduced to a MinHash
+signature over word shingles (with digits masked) and bucketed with LSH, so a
+near-duplicate of a recent message is found in roughly constant time. When
+the earlier verdict was high-confidence it is reused instead of running the
+model again, and every message is tagged with the campaign it belongs to.
+
+Messages with fewer than ``min_shingles`` distinct shingles are neither
+indexed nor matched: MinHash over a handful of items is too noisy to tell
+"hello" from "Hello friend", so such messages are always scored by the model
+and tagged with ``campaign_id`` ``None``.
+
+Memory is bounded by ``max_entries`` and entries expire ``ttl`` seconds after
+they were last matched.
+"""
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+CAMPAIGN_LOOKUPS = Counter(
+    'spam_detector_campaign_lookups_total', 'Near-duplicate index lookups')
+CAMPAIGN_HITS = Counter(
+    'spam_detector_campaign_hits_total',
+    'Lookups that reused a cached high-confidence verdict')
+CAMPAIGN_LOOKUP_SECONDS = Histogram(
+    'spam_detector_campaign_lookup_seconds', 'Near-duplicate index lookup latency',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+CAMPAIGN_ENTRIES = Gauge(
+    'spam_detector_campaign_index_entries', 'Messages resident in the near-duplicate index',
+    multiprocess_mode='livesum')
+
+_TOKEN_RE = re.compile(r'\w+')
+_DIGITS_RE = re.compile(r'\d+')
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Only the head of a message is fingerprinted; campaigns differ early if at all
+_MAX_SIGNATURE_CHARS = 2000
+
+
+class _Entry:
+    __slots__ = ('signature', 'band_keys', 'campaign_id', 'verdict', 'confident',
+                 'count', 'last_seen')
+
+    def __init__(self, signature, band_keys, campaign_id, verdict, confident, now):
+        self.signature = signature
+        self.band_keys = band_keys
+        self.campaign_id = campaign_id
+        self.verdict = verdict
+        self.confident = confident
+        self.count = 1
+        self.last_seen = now
+
+
+class CampaignMatch:
+    """Result of a lookup; pass it back to :meth:`CampaignIndex.add`."""
+    __slots__ = ('signature', 'band_keys', 'entry_id')
+
+    def __init__(self, signature, band_keys, entry_id):
+        self.signature = signature
+        self.band_keys = band_keys
+        self.entry_id = entry_id
+
+
+class CampaignIndex:
+    def __init__(self, num_perm=64, bands=16, threshold=0.7, ttl=3600,
+                 max_entries=50000, confidence=95.0, min_shingles=3, seed=42):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Verdicts at or beyond this spam/ham percentage may be reused
+        self.confidence = confidence
+        self.min_shingles = min_shingles
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=(num_perm, 1)).astype(np.uint64)
+
+        self._entries = OrderedDict()  # entry_id -> _Entry, oldest first
+        self._buckets = [dict() for _ in range(bands)]  # band key -> set(entry_id)
+        self._campaign_sizes = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _shingles(self, text):
+        tokens = _TOKEN_RE.findall(_DIGITS_RE.sub('0', text[:_MAX_SIGNATURE_CHARS].lower()))
+        return {' '.join(tokens[i:i + 3]) for i in range(len(tokens) - 2)}
+
+    def _signature(self, shingles):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64)
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def signature(self, text):
+        """MinHash signature of ``text`` as a ``num_perm`` uint64 vector.
+
+        Raises ValueError for texts of fewer than three words (no shingles).
+        """
+        return self._signature(self._shingles(text))
+
+    def _band_keys(self, signature):
+        return tuple(signature[i * self.rows:(i + 1) * self.rows].tobytes()
+                     for i in range(self.bands))
+
+    def _evict(self, now):
+        # Entries are kept in last-seen order, so expired ones sit at the front
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - entry.last_seen < self.ttl:
+                break
+            self._remove(entry_id)
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for band, key in enumerate(entry.band_keys):
+            ids = self._buckets[band].get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._buckets[band][key]
+        remaining = self._campaign_sizes.get(entry.campaign_id, 0) - entry.count
+        if remaining > 0:
+            self._campaign_sizes[entry.campaign_id] = remaining
+        else:
+            self._campaign_sizes.pop(entry.campaign_id, None)
+
+    def _best_candidate(self, signature, band_keys):
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            ids = self._buckets[band].get(key)
+            if ids:
+                candidates.update(ids)
+        best_id, best_score = None, self.threshold
+        for entry_id in candidates:
+            score = float(np.mean(self._entries[entry_id].signature == signature))
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+        return best_id
+
+    def lookup(self, text):
+        """Find the closest recent near-duplicate of ``text``.
+
+        Returns ``(match, result)``. ``result`` is a reusable verdict dict
+        (with ``campaign_id``/``campaign_size``) when the nearest neighbour
+        had a high-confidence verdict, otherwise ``None`` and the caller
+        should score the message and call :meth:`add` with ``match``.
+        ``match`` is ``None`` for messages too short to fingerprint.
+        """
+        start = time.perf_counter()
+        shingles = self._shingles(text)
+        if len(shingles) < self.min_shingles:
+            return None, None
+        signature = self._signature(shingles)
+        band_keys = self._band_keys(signature)
+        now = time.time()
+        result = None
+
+        with self._lock:
+            self._evict(now)
+            CAMPAIGN_ENTRIES.set(len(self._entries))
+            entry_id = self._best_candidate(signature, band_keys)
+            if entry_id is not None:
+                entry = self._entries[entry_id]
+                if entry.confident:
+                    entry.count += 1
+                    entry.last_seen = now
+                    self._entries.move_to_end(entry_id)
+                    self._campaign_sizes[entry.campaign_id] += 1
+                    result = dict(entry.verdict)
+                    result['campaign_id'] = entry.campaign_id
+                    result['campaign_size'] = self._campaign_sizes[entry.campaign_id]
+                    result['campaign_hit'] = True
+
+        CAMPAIGN_LOOKUPS.inc()
+        if result is not None:
+            CAMPAIGN_HITS.inc()
+        CAMPAIGN_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        return CampaignMatch(signature, band_keys, entry_id), result
+
+    def add(self, match, result):
+        """Index a freshly scored message and tag ``result`` with its campaign.
+
+        Messages too short to fingerprint (``match`` is ``None``) are not
+        indexed and get ``campaign_id`` and ``campaign_size`` ``None``.
+        """
+        if match is None:
+            result['campaign_id'] = None
+            result['campaign_size'] = None
+            result['campaign_hit'] = False
+            return result
+        verdict = {k: v for k, v in result.items() if k != 'text'}
+        confident = (result['spam_probability'] >= self.confidence
+                     or result['ham_probability'] >= self.confidence)
+        now = time.time()
+
+        with self._lock:
+            # Join the neighbour's campaign if it is still resident
+            neighbour = self._entries.get(match.entry_id) if match.entry_id is not None else None
+            if neighbour is not None:
+                campaign_id = neighbour.campaign_id
+            else:
+                campaign_id = f"c{self._next_id:x}"
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(match.signature, match.band_keys, campaign_id,
+                                             verdict, confident, now)
+            for band, key in enumerate(match.band_keys):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+            self._campaign_sizes[campaign_id] = self._campaign_sizes.get(campaign_id, 0) + 1
+            campaign_size = self._campaign_sizes[campaign_id]
+            self._evict(now)
+            CAMPAIGN_ENTRIES.set(len(self._entries))
+
+        result['campaign_id'] = campaign_id
+        result['campaign_size'] = campaign_size
+        result['campaign_hit'] = False
+        return result
+
+    def __len__(self):
+        return len(self._entries)
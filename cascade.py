@@ -0,0 +1,156 @@
+# cascade.py
+"""Two-stage cascade: escalate uncertain NB verdicts to a heavier local model.
+
+MultinomialNB scores every message. Only messages whose spam probability
+falls inside ``[low, high]`` are sent to a second-stage model, in batches, on
+a small fixed-size thread pool. Everything else keeps the cheap NB verdict, so
+the expensive model only sees the few percent of traffic that needs it.
+
+The second stage is loaded from a local path:
+
+* a directory containing ``config.json`` is loaded as a Hugging Face
+  sequence-classification model (``transformers`` is imported lazily);
+* any other file is unpickled and must expose ``predict_proba(texts)``
+  returning ``[ham, spam]`` columns, e.g. a scikit-learn ``Pipeline``.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+CASCADE_MESSAGES = Counter(
+    'spam_detector_cascade_messages_total', 'Messages scored by the first (NB) stage')
+CASCADE_ESCALATIONS = Counter(
+    'spam_detector_cascade_escalations_total',
+    'Messages escalated to the second stage', ['outcome'])
+CASCADE_STAGE_SECONDS = Histogram(
+    'spam_detector_cascade_stage_seconds', 'Per-batch latency of each cascade stage', ['stage'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+class TransformersStage:
+    """Local Hugging Face text classifier pinned to CPU."""
+
+    def __init__(self, path, num_threads=None):
+        import torch
+        from transformers import pipeline
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self._pipeline = pipeline('text-classification', model=path, tokenizer=path,
+                                  device=-1, top_k=None, truncation=True)
+        id2label = self._pipeline.model.config.id2label
+        self._spam_label = next(
+            (label for label in id2label.values() if 'spam' in label.lower()),
+            id2label[max(id2label)])
+
+    def predict_proba(self, texts):
+        rows = []
+        for scores in self._pipeline(list(texts)):
+            spam = next(s['score'] for s in scores if s['label'] == self._spam_label)
+            rows.append((1.0 - spam, spam))
+        return np.asarray(rows, dtype=np.float64)
+
+
+def load_second_stage(path, num_threads=None):
+    """Load a second-stage model from a local directory or pickle file."""
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, 'config.json')):
+            raise FileNotFoundError(f"No config.json in second-stage model directory '{path}'.")
+        return TransformersStage(path, num_threads=num_threads)
+
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    if not hasattr(model, 'predict_proba'):
+        raise ValueError(f"Second-stage model at '{path}' does not implement predict_proba().")
+    return model
+
+
+class Cascade:
+    def __init__(self, second_stage, low=0.2, high=0.8, batch_size=32, max_workers=1,
+                 max_pending_batches=4, timeout=5.0):
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError("Uncertainty band must satisfy 0 <= low <= high <= 1.")
+        self.second_stage = second_stage
+        self.low = low
+        self.high = high
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='cascade')
+        # Caps queued work; batches over the limit keep their NB verdict
+        self._slots = threading.BoundedSemaphore(max_pending_batches)
+
+    def _run_batch(self, texts):
+        try:
+            start = time.perf_counter()
+            proba = np.asarray(self.second_stage.predict_proba(texts), dtype=np.float64)
+            CASCADE_STAGE_SECONDS.labels(stage='second').observe(time.perf_counter() - start)
+            return proba
+        finally:
+            self._slots.release()
+
+    def refine(self, messages, probabilities, first_stage_seconds=None):
+        """Return ``(probabilities, escalated)`` with uncertain rows re-scored.
+
+        ``probabilities`` is the NB ``predict_proba`` output; ``escalated`` is
+        a boolean mask of rows whose probabilities came from the second stage.
+        Batches still unfinished ``timeout`` seconds after submission keep
+        their NB verdict.
+        """
+        CASCADE_MESSAGES.inc(len(messages))
+        if first_stage_seconds is not None:
+            CASCADE_STAGE_SECONDS.labels(stage='nb').observe(first_stage_seconds)
+
+        spam = probabilities[:, 1]
+        candidates = np.flatnonzero((spam >= self.low) & (spam <= self.high))
+        escalated = np.zeros(len(messages), dtype=bool)
+        if not len(candidates):
+            return probabilities, escalated
+
+        refined = probabilities.copy()
+        futures = []
+        for start in range(0, len(candidates), self.batch_size):
+            rows = candidates[start:start + self.batch_size]
+            if not self._slots.acquire(blocking=False):
+                CASCADE_ESCALATIONS.labels(outcome='skipped').inc(len(rows))
+                continue
+            try:
+                future = self._executor.submit(self._run_batch, [messages[i] for i in rows])
+            except RuntimeError:
+                self._slots.release()
+                raise
+            futures.append((rows, future))
+
+        # One deadline for the whole call, however many batches were queued
+        done, _ = wait([future for _, future in futures], timeout=self.timeout)
+        for rows, future in futures:
+            if future not in done:
+                # A batch that never started gives its slot back here
+                if future.cancel():
+                    self._slots.release()
+                logger.warning(f"Second-stage scoring timed out for {len(rows)} messages")
+                CASCADE_ESCALATIONS.labels(outcome='failed').inc(len(rows))
+                continue
+            try:
+                proba = future.result()
+            except Exception as e:
+                # Keep the NB verdict; a slow or broken second stage must not fail scoring
+                logger.warning(f"Second-stage scoring failed for {len(rows)} messages: {e}")
+                CASCADE_ESCALATIONS.labels(outcome='failed').inc(len(rows))
+                continue
+            refined[rows] = proba
+            escalated[rows] = True
+            CASCADE_ESCALATIONS.labels(outcome='scored').inc(len(rows))
+
+        return refined, escalated
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,233 @@
+# corpus.py
+"""Canonical training-corpus snapshot built from the CSV sources.
+
+``spam_dataset.csv`` (with its junk trailing columns and non-UTF-8 bytes)
+and ``feedback_data.csv`` are parsed once, normalized and deduplicated, and
+written to a snapshot directory:
+
+* ``texts.bin``    - all message texts, UTF-8, back to back
+* ``offsets.npy``  - int64 start offsets into ``texts.bin`` (n + 1 entries)
+* ``labels.npy``   - int8 labels (0 ham, 1 spam)
+* ``manifest.json``- SHA-256 of every source file, row counts and a content
+  hash over texts and labels
+
+Training memory-maps the arrays instead of re-parsing CSVs.
+:func:`ensure_corpus` rebuilds the snapshot only when a source file's hash no
+longer matches the manifest. The build is deterministic: the same sources
+always give the same texts, order, labels and content hash.
+
+Feedback labels (``user_marked_as_actual``) win over the base dataset for
+the same message; among feedback rows the latest one wins. Feedback rows
+whose text was pasted with a leading ``ham<TAB>``/``spam<TAB>`` label have
+that prefix stripped.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DEFAULT_DATASET = 'spam_dataset.csv'
+DEFAULT_FEEDBACK = 'feedback_data.csv'
+DEFAULT_CORPUS_DIR = 'corpus'
+LABELS = {'ham': 0, 'spam': 1}
+
+_PASTED_LABEL = re.compile(r'^\s*(?:ham|spam)\t', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def clean_text(text):
+    """Unicode-normalize and trim a message; strips a pasted ``ham\\t`` prefix."""
+    text = unicodedata.normalize('NFC', str(text))
+    return _PASTED_LABEL.sub('', text).strip()
+
+
+def dedupe_key(text):
+    return _WHITESPACE.sub(' ', text.casefold())
+
+
+def read_feedback(path):
+    """Return ``[(text, label)]`` from the feedback CSV, oldest first."""
+    df = pd.read_csv(path, encoding='utf-8', dtype=str, keep_default_na=False)
+    if 'message' not in df.columns or 'user_marked_as_actual' not in df.columns:
+        raise ValueError(f"Feedback file '{path}' needs 'message' and 'user_marked_as_actual' columns")
+    rows = []
+    for message, label in zip(df['message'], df['user_marked_as_actual']):
+        label = LABELS.get(label.strip().lower())
+        text = clean_text(message)
+        if label is not None and text:
+            rows.append((text, label))
+    return rows
+
+
+def collect_examples(dataset_path, feedback_path=None):
+    """Merge, normalize and dedupe the sources into ``(texts, labels)``."""
+    from model import load_dataset  # model.py imports this module
+
+    df = load_dataset(dataset_path)
+    texts = []
+    labels = []
+    positions = {}
+
+    def add(text, label, override):
+        key = dedupe_key(text)
+        index = positions.get(key)
+        if index is None:
+            positions[key] = len(texts)
+            texts.append(text)
+            labels.append(label)
+        elif override:
+            labels[index] = label
+
+    for text, label in zip(df['v2'], df['label_num']):
+        text = clean_text(text)
+        if text:
+            add(text, int(label), override=False)
+    base_rows = len(texts)
+
+    if feedback_path and os.path.exists(feedback_path):
+        for text, label in read_feedback(feedback_path):
+            add(text, label, override=True)
+
+    logger.info(f"Corpus: {len(df)} dataset rows -> {base_rows} unique, {len(texts)} with feedback")
+    return texts, np.asarray(labels, dtype=np.int8)
+
+
+def content_hash(texts_blob, offsets, labels):
+    digest = hashlib.sha256()
+    for part in (offsets.tobytes(), labels.tobytes(), texts_blob):
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def build_corpus(dataset_path=DEFAULT_DATASET, feedback_path=DEFAULT_FEEDBACK, out_dir=DEFAULT_CORPUS_DIR):
+    """Build the snapshot in ``out_dir`` from the sources and load it."""
+    sources = {'dataset': dataset_path}
+    if feedback_path and os.path.exists(feedback_path):
+        sources['feedback'] = feedback_path
+    source_hashes = {name: {'path': path, 'sha256': file_sha256(path)} for name, path in sources.items()}
+
+    texts, labels = collect_examples(dataset_path, feedback_path)
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    blob = b''.join(encoded)
+
+    manifest = {
+        'version': FORMAT_VERSION,
+        'sources': source_hashes,
+        'count': len(texts),
+        'spam': int(labels.sum()),
+        'content_hash': content_hash(blob, offsets, labels),
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Data files first, manifest last: a reader never sees a new manifest with old data
+    suffix = f".tmp-{os.getpid()}"
+    with open(os.path.join(out_dir, 'texts.bin' + suffix), 'wb') as f:
+        f.write(blob)
+    with open(os.path.join(out_dir, 'offsets.npy' + suffix), 'wb') as f:
+        np.save(f, offsets)
+    with open(os.path.join(out_dir, 'labels.npy' + suffix), 'wb') as f:
+        np.save(f, labels)
+    with open(os.path.join(out_dir, 'manifest.json' + suffix), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    for name in ('texts.bin', 'offsets.npy', 'labels.npy', 'manifest.json'):
+        os.replace(os.path.join(out_dir, name + suffix), os.path.join(out_dir, name))
+
+    logger.info(f"Wrote corpus snapshot {manifest['content_hash'][:12]} ({len(texts)} messages) to {out_dir}")
+    return load_corpus(out_dir)
+
+
+def is_corpus(path):
+    return os.path.isfile(os.path.join(path, 'manifest.json'))
+
+
+class Corpus:
+    """Memory-mapped view of a snapshot built by :func:`build_corpus`."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.labels = np.load(os.path.join(path, 'labels.npy'), mmap_mode='r')
+        count = self.manifest['count']
+        if len(self.offsets) != count + 1 or len(self.labels) != count:
+            raise ValueError(f"Corpus snapshot in '{path}' is incomplete or inconsistent")
+        texts_path = os.path.join(path, 'texts.bin')
+        if os.path.getsize(texts_path):
+            self._texts = np.memmap(texts_path, dtype=np.uint8, mode='r')
+        else:
+            self._texts = np.zeros(0, dtype=np.uint8)
+
+    @property
+    def content_hash(self):
+        return self.manifest['content_hash']
+
+    def __len__(self):
+        return len(self.labels)
+
+    def text(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self._texts[start:end].tobytes().decode('utf-8')
+
+    def texts(self):
+        return [self.text(i) for i in range(len(self))]
+
+
+def load_corpus(path=DEFAULT_CORPUS_DIR):
+    return Corpus(path)
+
+
+def is_stale(out_dir=DEFAULT_CORPUS_DIR, dataset_path=DEFAULT_DATASET, feedback_path=DEFAULT_FEEDBACK):
+    """True if the snapshot is missing or any source file changed since it was built."""
+    if not is_corpus(out_dir):
+        return True
+    try:
+        with open(os.path.join(out_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if manifest.get('version') != FORMAT_VERSION:
+        return True
+
+    expected = {'dataset': dataset_path}
+    if feedback_path and os.path.exists(feedback_path):
+        expected['feedback'] = feedback_path
+    recorded = manifest.get('sources', {})
+    if set(recorded) != set(expected):
+        return True
+    return any(recorded[name].get('path') != path or recorded[name].get('sha256') != file_sha256(path)
+               for name, path in expected.items())
+
+
+def ensure_corpus(dataset_path=DEFAULT_DATASET, feedback_path=DEFAULT_FEEDBACK, out_dir=DEFAULT_CORPUS_DIR):
+    """Load the snapshot in ``out_dir``, rebuilding it first if a source changed."""
+    if not is_stale(out_dir, dataset_path, feedback_path):
+        try:
+            return load_corpus(out_dir)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Corpus snapshot in {out_dir} unreadable, rebuilding: {e}")
+    return build_corpus(dataset_path, feedback_path, out_dir)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    corpus = ensure_corpus()
+    print(f"{len(corpus)} messages ({int(np.sum(corpus.labels))} spam), content hash {corpus.content_hash}")
@@ -0,0 +1,286 @@
+# drift_monitor.py
+"""Streaming model-quality and drift signals in constant memory.
+
+Predictions and feedback update a ring of fixed-size time buckets (one per
+``bucket_seconds`` over the last ``window`` seconds), each holding:
+
+* a fixed-bin histogram of the model's spam probability,
+* prediction and spam counts (the spam rate counts model-scored results
+  only, matching the reference it is compared with),
+* token and unseen-token counts: how many tokens of the scored messages are
+  missing from the vectorizer vocabulary, and how many of those belong to
+  tokens that keep recurring according to a count-min sketch (new
+  vocabulary rather than one-off typos),
+* feedback and disagreement counts.
+
+The first ``reference_size`` model-scored predictions are frozen as the
+reference distribution; drift in the probability histogram is the population
+stability index (PSI) of the window against it. Raw messages are never
+stored. Gauges are refreshed at most every ``export_interval`` seconds from
+the update path (values computed at scrape time would not reach Prometheus
+in gunicorn's multiprocess mode), so a prediction only pays for a few
+counter updates (plus tokenization for the sampled share).
+"""
+import random
+import threading
+import time
+
+import numpy as np
+from prometheus_client import Gauge, Histogram
+
+from model import MAX_FEATURE_CHARS
+
+SPAM_PROBABILITY = Histogram(
+    'spam_detector_spam_probability', 'Spam probability (0-1) of model-scored messages',
+    buckets=tuple(round(b, 2) for b in np.linspace(0.05, 1.0, 20)))
+# Every worker keeps its own window; under gunicorn the worst worker is reported
+DRIFT_SIGNAL = Gauge(
+    'spam_detector_drift_signal', 'Current value of each drift / quality signal over the window', ['signal'],
+    multiprocess_mode='livemax')
+DRIFT_THRESHOLD = Gauge(
+    'spam_detector_drift_threshold', 'Alert threshold of each drift / quality signal', ['signal'],
+    multiprocess_mode='livemax')
+DRIFT_ALERT = Gauge(
+    'spam_detector_drift_alert', '1 when a drift / quality signal is past its threshold', ['signal'],
+    multiprocess_mode='livemax')
+
+SIGNALS = ('probability_psi', 'spam_rate_shift', 'unseen_token_rate', 'feedback_disagreement_rate')
+DEFAULT_THRESHOLDS = {
+    'probability_psi': 0.2,
+    'spam_rate_shift': 0.15,
+    'unseen_token_rate': 0.3,
+    'feedback_disagreement_rate': 0.2,
+}
+_EPSILON = 1e-4
+
+
+class CountMinSketch:
+    def __init__(self, width=4096, depth=4):
+        self.width = width
+        self.depth = depth
+        self._table = np.zeros((depth, width), dtype=np.int32)
+
+    def add(self, item, count=1):
+        """Add ``count`` occurrences of ``item`` and return its new estimate."""
+        estimate = None
+        for row in range(self.depth):
+            column = hash((row, item)) % self.width
+            self._table[row, column] += count
+            value = int(self._table[row, column])
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate
+
+    def estimate(self, item):
+        return min(int(self._table[row, hash((row, item)) % self.width]) for row in range(self.depth))
+
+    def decay(self):
+        """Halve every counter so old tokens fade out."""
+        self._table >>= 1
+
+
+class DriftMonitor:
+    def __init__(self, window=3600, bucket_seconds=60, bins=20, reference_size=5000,
+                 min_samples=100, min_feedback=20, token_sample_rate=0.1, recurring_min=3,
+                 thresholds=None, sketch_width=4096, sketch_depth=4, export_interval=5.0):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.bins = bins
+        self.reference_size = reference_size
+        self.min_samples = min_samples
+        self.min_feedback = min_feedback
+        self.token_sample_rate = token_sample_rate
+        self.recurring_min = recurring_min
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.export_interval = export_interval
+        self._exported = float('-inf')
+
+        self._lock = threading.Lock()
+        slots = max(1, window // bucket_seconds)
+        self._buckets = np.full(slots, -1, dtype=np.int64)
+        self._predictions = np.zeros(slots, dtype=np.int64)
+        self._spam = np.zeros(slots, dtype=np.int64)
+        self._histogram = np.zeros((slots, bins), dtype=np.int64)
+        self._tokens = np.zeros(slots, dtype=np.int64)
+        self._unseen = np.zeros(slots, dtype=np.int64)
+        self._recurring = np.zeros(slots, dtype=np.int64)
+        self._feedback = np.zeros(slots, dtype=np.int64)
+        self._disagreements = np.zeros(slots, dtype=np.int64)
+
+        self._reference = np.zeros(bins, dtype=np.int64)
+        self._reference_spam = 0
+        self._sketch = CountMinSketch(sketch_width, sketch_depth)
+        self._last_decay = time.time()
+
+        self._vectorizer = None
+        self._vocabulary = None
+        self._stop_words = frozenset()
+        self._preprocess = None
+        self._tokenize = None
+
+        for signal in SIGNALS:
+            DRIFT_THRESHOLD.labels(signal=signal).set(self.thresholds[signal])
+
+    @property
+    def reference_ready(self):
+        return int(self._reference.sum()) >= self.reference_size
+
+    def _slot(self, now):
+        bucket = int(now // self.bucket_seconds)
+        slot = bucket % len(self._buckets)
+        if self._buckets[slot] != bucket:
+            self._buckets[slot] = bucket
+            for counts in (self._predictions, self._spam, self._tokens, self._unseen,
+                           self._recurring, self._feedback, self._disagreements):
+                counts[slot] = 0
+            self._histogram[slot].fill(0)
+        return slot
+
+    def _use_vectorizer(self, vectorizer):
+        if vectorizer is self._vectorizer:
+            return
+        self._vectorizer = vectorizer
+        self._vocabulary = vectorizer.vocabulary_
+        self._stop_words = frozenset(vectorizer.get_stop_words() or ())
+        self._preprocess = vectorizer.build_preprocessor()
+        self._tokenize = vectorizer.build_tokenizer()
+
+    def _unseen_tokens(self, text):
+        """Return ``(token count, out-of-vocabulary tokens)`` for the featurized head of ``text``."""
+        tokens = 0
+        unseen = []
+        for token in self._tokenize(self._preprocess(text[:MAX_FEATURE_CHARS])):
+            if token in self._stop_words:
+                continue
+            tokens += 1
+            if token not in self._vocabulary:
+                unseen.append(token)
+        return tokens, unseen
+
+    def observe(self, results, vectorizer=None, now=None):
+        """Record served predictions (result dicts from ``SpamDetector.predict``).
+
+        Rule-decided and campaign-cached results count towards the prediction
+        total only; the spam rate, histogram and token statistics describe the
+        model itself, like the reference they are compared with.
+        With ``vectorizer`` a sampled share of messages is tokenized against
+        its vocabulary.
+        """
+        if isinstance(results, dict):
+            results = [results]
+        now = time.time() if now is None else now
+        if vectorizer is not None:
+            with self._lock:
+                self._use_vectorizer(vectorizer)
+
+        # Tokenize the sampled messages before taking the lock; only the counts go in under it
+        sampled = {}
+        if self._vocabulary is not None:
+            for i, result in enumerate(results):
+                if ('rule_id' not in result and not result.get('campaign_hit') and 'text' in result
+                        and random.random() < self.token_sample_rate):
+                    sampled[i] = self._unseen_tokens(result['text'])
+
+        with self._lock:
+            if now - self._last_decay >= self.window:
+                self._sketch.decay()
+                self._last_decay = now
+            slot = self._slot(now)
+            for i, result in enumerate(results):
+                self._predictions[slot] += 1
+                if 'rule_id' in result or result.get('campaign_hit'):
+                    continue
+
+                self._spam[slot] += bool(result['is_spam'])
+
+                probability = result['spam_probability'] / 100.0
+                SPAM_PROBABILITY.observe(probability)
+                index = min(self.bins - 1, int(probability * self.bins))
+                self._histogram[slot, index] += 1
+                if not self.reference_ready:
+                    self._reference[index] += 1
+                    self._reference_spam += bool(result['is_spam'])
+
+                if i in sampled:
+                    tokens, unseen = sampled[i]
+                    self._tokens[slot] += tokens
+                    self._unseen[slot] += len(unseen)
+                    self._recurring[slot] += sum(self._sketch.add(token) >= self.recurring_min
+                                                 for token in unseen)
+        self._maybe_export(now)
+
+    def observe_feedback(self, predicted_spam, actual_spam, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            slot = self._slot(now)
+            self._feedback[slot] += 1
+            self._disagreements[slot] += bool(predicted_spam) != bool(actual_spam)
+        self._maybe_export(now)
+
+    def snapshot(self, now=None):
+        """Window totals and derived signals (None where there is no data yet)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            live = self._buckets > int(now // self.bucket_seconds) - len(self._buckets)
+            predictions = int(self._predictions[live].sum())
+            spam = int(self._spam[live].sum())
+            histogram = self._histogram[live].sum(axis=0)
+            tokens = int(self._tokens[live].sum())
+            unseen = int(self._unseen[live].sum())
+            recurring = int(self._recurring[live].sum())
+            feedback = int(self._feedback[live].sum())
+            disagreements = int(self._disagreements[live].sum())
+            reference = self._reference.copy()
+            reference_spam = self._reference_spam
+
+        reference_total = int(reference.sum())
+        scored = int(histogram.sum())
+        psi = spam_rate_shift = None
+        if self.reference_ready and scored:
+            expected = np.maximum(reference / reference_total, _EPSILON)
+            actual = np.maximum(histogram / scored, _EPSILON)
+            psi = float(np.sum((actual - expected) * np.log(actual / expected)))
+        spam_rate = spam / scored if scored else None
+        if self.reference_ready and spam_rate is not None:
+            spam_rate_shift = abs(spam_rate - reference_spam / reference_total)
+
+        return {
+            'predictions': predictions,
+            'scored': scored,
+            'spam_rate': spam_rate,
+            'spam_rate_shift': spam_rate_shift,
+            'probability_histogram': histogram.tolist(),
+            'probability_psi': psi,
+            'tokens': tokens,
+            'unseen_token_rate': unseen / tokens if tokens else None,
+            'recurring_unseen_token_rate': recurring / tokens if tokens else None,
+            'feedback': feedback,
+            'feedback_disagreement_rate': disagreements / feedback if feedback else None,
+        }
+
+    def alerts(self, snapshot=None):
+        """Return ``{signal: bool}``; signals with too little data never alert."""
+        snapshot = snapshot or self.snapshot()
+        enough = {
+            'probability_psi': snapshot['scored'] >= self.min_samples,
+            'spam_rate_shift': snapshot['scored'] >= self.min_samples,
+            'unseen_token_rate': snapshot['tokens'] >= self.min_samples,
+            'feedback_disagreement_rate': snapshot['feedback'] >= self.min_feedback,
+        }
+        return {signal: bool(enough[signal] and snapshot[signal] is not None
+                             and snapshot[signal] > self.thresholds[signal])
+                for signal in SIGNALS}
+
+    def _maybe_export(self, now):
+        if now - self._exported < self.export_interval:
+            return
+        self._exported = now
+        self.export(now)
+
+    def export(self, now=None):
+        """Publish the current signals and alert states to the Prometheus gauges."""
+        snapshot = self.snapshot(now)
+        alerts = self.alerts(snapshot)
+        for signal in SIGNALS:
+            value = snapshot[signal]
+            DRIFT_SIGNAL.labels(signal=signal).set(float('nan') if value is None else value)
+            DRIFT_ALERT.labels(signal=signal).set(float(alerts[signal]))
@@ -0,0 +1,172 @@
+# email_ingest.py
+"""Streaming ingestion of RFC 822 email (.eml) and mbox files.
+
+Messages are read line by line and handed to the stdlib feed parser, so only
+one message is ever held in memory. Each message is capped at
+``MAX_MESSAGE_BYTES`` of raw input, attachments are skipped, and only the
+first text part is decoded, which keeps memory constant per message no
+matter how large the mailbox is.
+"""
+import email
+import html
+import re
+from email import policy
+from email.feedparser import BytesFeedParser
+
+from model import MAX_FEATURE_CHARS
+
+# Raw bytes fed to the parser per message; anything beyond is discarded.
+MAX_MESSAGE_BYTES = 256 * 1024
+# Messages scored per call to SpamDetector.predict when streaming.
+DEFAULT_BATCH_SIZE = 500
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TAG_RE = re.compile(r'<[^>]+>')
+_STRIP_BLOCK_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+
+def normalize_text(text, max_chars=MAX_FEATURE_CHARS):
+    """Collapse whitespace and cap the length of extracted email text."""
+    # Cap before collapsing so a huge body never gets fully re-scanned
+    text = text[:max_chars * 2]
+    return _WHITESPACE_RE.sub(' ', text).strip()[:max_chars]
+
+
+def _html_to_text(markup):
+    markup = _STRIP_BLOCK_RE.sub(' ', markup)
+    return html.unescape(_TAG_RE.sub(' ', markup))
+
+
+def _decode_part(part):
+    """Decode a single MIME part's payload, tolerating bad charsets."""
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeError, KeyError, AssertionError):
+        payload = part.get_payload(decode=True) or b''
+        return payload.decode('latin1', errors='replace')
+
+
+def extract_text(msg, max_chars=MAX_FEATURE_CHARS):
+    """Return normalized "subject + body" text for a parsed email message.
+
+    Attachments are skipped without decoding. ``text/plain`` is preferred;
+    ``text/html`` is only decoded (and stripped of tags) when no plain part
+    exists.
+    """
+    subject = str(msg.get('subject', '') or '')
+
+    plain_part = None
+    html_part = None
+    for part in msg.walk():
+        if part.is_multipart() or part.is_attachment():
+            continue
+        content_type = part.get_content_type()
+        if content_type == 'text/plain' and plain_part is None:
+            plain_part = part
+            break  # Nothing better to find, stop walking
+        if content_type == 'text/html' and html_part is None:
+            html_part = part
+
+    # Transfer encodings are decoded only for the part we actually use
+    if plain_part is not None:
+        body = _decode_part(plain_part)
+    elif html_part is not None:
+        body = _html_to_text(_decode_part(html_part))
+    else:
+        body = ''
+
+    return normalize_text(f"{subject}\n{body}", max_chars)
+
+
+def _parse_bounded(lines, max_bytes=MAX_MESSAGE_BYTES):
+    """Feed an iterable of raw lines to the parser, stopping at ``max_bytes``."""
+    parser = BytesFeedParser(policy=policy.default)
+    fed = 0
+    for line in lines:
+        if fed >= max_bytes:
+            continue  # Drain the remainder without buffering it
+        chunk = line[:max_bytes - fed]
+        parser.feed(chunk)
+        fed += len(chunk)
+    return parser.close()
+
+
+def parse_eml(fileobj, max_chars=MAX_FEATURE_CHARS):
+    """Parse a single .eml file object (opened in binary mode) into text."""
+    return extract_text(_parse_bounded(fileobj), max_chars)
+
+
+def _unescape_from(line):
+    # mboxrd/mboxo quote body lines starting with "From " as ">From "
+    stripped = line.lstrip(b'>')
+    if stripped.startswith(b'From ') and line.startswith(b'>'):
+        return line[1:]
+    return line
+
+
+def iter_mbox(fileobj, max_chars=MAX_FEATURE_CHARS, max_bytes=MAX_MESSAGE_BYTES):
+    """Yield normalized text for each message in an mbox file object.
+
+    The file is consumed incrementally: a new parser is started on every
+    ``From `` separator line and the previous message is finalized, so memory
+    use never depends on the size of the mailbox.
+    """
+    parser = None
+    fed = 0
+    for line in fileobj:
+        if line.startswith(b'From '):
+            if parser is not None:
+                yield extract_text(parser.close(), max_chars)
+            parser = BytesFeedParser(policy=policy.default)
+            fed = 0
+            continue
+        if parser is None:
+            continue  # Junk before the first separator
+        if fed >= max_bytes:
+            continue
+        chunk = _unescape_from(line)[:max_bytes - fed]
+        parser.feed(chunk)
+        fed += len(chunk)
+
+    if parser is not None:
+        yield extract_text(parser.close(), max_chars)
+
+
+def iter_email_file(path, max_chars=MAX_FEATURE_CHARS):
+    """Yield message texts from an .eml or .mbox file on disk."""
+    with open(path, 'rb') as f:
+        if path.lower().endswith('.eml'):
+            yield parse_eml(f, max_chars)
+        else:
+            yield from iter_mbox(f, max_chars)
+
+
+def predict_stream(detector, texts, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """Score an iterable of texts in fixed-size batches, yielding results.
+
+    Keeps the vectorizer working on bounded sparse matrices instead of one
+    matrix for the whole mailbox. ``on_batch(results)`` is called with each
+    scored batch before its results are yielded.
+    """
+    batch = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) >= batch_size:
+            results = detector.predict(batch)
+            if on_batch is not None:
+                on_batch(results)
+            yield from results
+            batch = []
+    if batch:
+        results = detector.predict(batch)
+        if on_batch is not None:
+            on_batch(results)
+        yield from results
+
+
+def parse_message_bytes(raw, max_chars=MAX_FEATURE_CHARS):
+    """Parse a raw RFC 822 message held in memory (e.g. from a JSON body)."""
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8', errors='replace')
+    msg = email.message_from_bytes(raw[:MAX_MESSAGE_BYTES], policy=policy.default)
+    return extract_text(msg, max_chars)
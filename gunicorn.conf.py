@@ -0,0 +1,43 @@
+# gunicorn.conf.py
+"""Gunicorn settings shared by the Dockerfile, Procfile and ``make prod``.
+
+Gunicorn picks this file up from the working directory. Every worker keeps
+its own Prometheus metrics; with ``PROMETHEUS_MULTIPROC_DIR`` set they write
+them to that directory and ``/metrics`` aggregates the whole pod (see the
+``multiprocess_mode`` of each gauge).
+"""
+import os
+import shutil
+
+from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
+
+from live_metrics import table_path
+from profiling import snapshot_path
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get('GUNICORN_WORKERS', os.environ.get('WEB_CONCURRENCY', 4)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be summed into the new one
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        GunicornInternalPrometheusMetrics.mark_process_dead_on_child_exit(worker.pid)
+        # The dashboard window and memory report of the exited worker (see
+        # live_metrics.py and profiling.py)
+        for path in (table_path(os.path.join(multiproc_dir, 'live'), worker.pid),
+                     snapshot_path(os.path.join(multiproc_dir, 'profile'), worker.pid)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
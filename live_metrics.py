@@ -0,0 +1,203 @@
+# live_metrics.py
+"""Rolling-window request metrics pushed to dashboards over Server-Sent Events.
+
+:class:`LiveMetrics` keeps one slot per second for the last ``window``
+seconds. Each slot holds request/cache counters and a log-bucketed latency
+histogram (a DDSketch-style quantile sketch with bounded relative error), so
+memory is fixed no matter how much traffic arrives.
+
+With ``shared_dir`` (under gunicorn, a directory inside
+``PROMETHEUS_MULTIPROC_DIR``) each worker keeps its table in a memory-mapped
+file there and a snapshot merges the tables of every worker, so any stream
+shows the traffic of the whole pod. A worker's file is removed when it exits
+(see ``gunicorn.conf.py``).
+
+:class:`LiveMetricsStream` computes one snapshot per interval in a single
+background thread and hands the same serialized payload to every connected
+client. Adding dashboard tabs adds no aggregation work, and each browser
+shares one connection between its tabs (see ``static/js/modern-script.js``).
+"""
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from prometheus_client import Gauge
+
+LIVE_METRICS_SUBSCRIBERS = Gauge(
+    'spam_detector_live_metrics_subscribers', 'Open live-metrics event streams',
+    multiprocess_mode='livesum')
+
+# Columns of a per-second slot; the latency histogram follows them
+_SECOND, _REQUESTS, _CACHE_LOOKUPS, _CACHE_HITS, _LATENCY = range(5)
+
+
+def table_path(shared_dir, pid):
+    return os.path.join(shared_dir, f"live_metrics_{pid}.bin")
+
+
+class LiveMetrics:
+    def __init__(self, window=60, relative_accuracy=0.02, min_latency=1e-4, max_latency=120.0,
+                 shared_dir=None):
+        self.window = window
+        self.shared_dir = shared_dir
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._min_latency = min_latency
+        self._bins = int(math.ceil(math.log(max_latency / min_latency) / self._log_gamma)) + 1
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._table = None
+
+    def _own_table(self):
+        # Created per PID so a worker forked from a preloaded app gets its own file
+        pid = os.getpid()
+        if self._pid != pid:
+            shape = (self.window, _LATENCY + self._bins)
+            if self.shared_dir:
+                os.makedirs(self.shared_dir, exist_ok=True)
+                table = np.memmap(table_path(self.shared_dir, pid), dtype=np.int64, mode='w+', shape=shape)
+            else:
+                table = np.zeros(shape, dtype=np.int64)
+            table[:, _SECOND] = -1
+            self._table, self._pid = table, pid
+        return self._table
+
+    def _tables(self):
+        own = self._own_table()
+        if not self.shared_dir:
+            return [own]
+        tables = [own]
+        shape = own.shape
+        for path in glob.glob(table_path(self.shared_dir, '*')):
+            if path == table_path(self.shared_dir, self._pid):
+                continue
+            try:
+                tables.append(np.memmap(path, dtype=np.int64, mode='r', shape=shape))
+            except (OSError, ValueError):
+                continue  # Worker exited (or is still creating its file)
+        return tables
+
+    def _bin(self, latency):
+        if latency <= self._min_latency:
+            return 0
+        return min(self._bins - 1, int(math.ceil(math.log(latency / self._min_latency) / self._log_gamma)))
+
+    def _bin_value(self, index):
+        # Midpoint (in log space) of the bucket, within relative_accuracy of any member
+        return self._min_latency * 2 * self._gamma ** index / (self._gamma + 1)
+
+    def record(self, latency, cache_hit=None, now=None):
+        """Record one request; ``cache_hit`` is None when no cache lookup happened."""
+        now = time.time() if now is None else now
+        second = int(now)
+        index = self._bin(latency)
+        with self._lock:
+            row = self._own_table()[second % self.window]
+            if row[_SECOND] != second:
+                row[_REQUESTS:] = 0
+                row[_SECOND] = second
+            row[_REQUESTS] += 1
+            row[_LATENCY + index] += 1
+            if cache_hit is not None:
+                row[_CACHE_LOOKUPS] += 1
+                if cache_hit:
+                    row[_CACHE_HITS] += 1
+
+    def _quantile(self, histogram, total, q):
+        rank = q * (total - 1)
+        index = int(np.searchsorted(np.cumsum(histogram), rank, side='right'))
+        return self._bin_value(min(index, self._bins - 1))
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        totals = np.zeros(_LATENCY + self._bins, dtype=np.int64)
+        with self._lock:
+            tables = self._tables()
+            for table in tables:
+                # Other workers write without our lock; a slot being reset reads as a blip at worst
+                totals += table[table[:, _SECOND] > int(now) - self.window].sum(axis=0)
+        requests = int(totals[_REQUESTS])
+        lookups = int(totals[_CACHE_LOOKUPS])
+        hits = int(totals[_CACHE_HITS])
+        histogram = totals[_LATENCY:]
+
+        latency_ms = {'p50': None, 'p95': None, 'p99': None}
+        if requests:
+            for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+                latency_ms[name] = round(self._quantile(histogram, requests, q) * 1000, 1)
+
+        return {
+            'timestamp': now,
+            'window_seconds': self.window,
+            'workers': len(tables),
+            'requests': requests,
+            'throughput': round(requests / self.window, 2),
+            'latency_ms': latency_ms,
+            'cache_hit_rate': round(100.0 * hits / lookups, 1) if lookups else None,
+        }
+
+
+class LiveMetricsStream:
+    def __init__(self, metrics, interval=2.0, max_subscribers=2, max_duration=300):
+        self.metrics = metrics
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        # Streams end periodically; EventSource reconnects on its own
+        self.max_duration = max_duration
+        self._cond = threading.Condition()
+        self._payload = None
+        self._version = 0
+        self._subscribers = 0
+        self._thread = None
+
+    def _run(self):
+        while True:
+            payload = json.dumps(self.metrics.snapshot())
+            with self._cond:
+                self._payload = payload
+                self._version += 1
+                self._cond.notify_all()
+            time.sleep(self.interval)
+
+    def _ensure_running(self):
+        # Started lazily so each forked worker gets its own publisher thread
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-metrics', daemon=True)
+                self._thread.start()
+
+    def subscribe(self):
+        """Reserve a subscriber slot; returns False when the worker is full.
+
+        The caller releases it with :meth:`release` once the response is
+        closed, whether or not :meth:`events` was ever iterated (a HEAD
+        request never reads the body).
+        """
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                return False
+            self._subscribers += 1
+            LIVE_METRICS_SUBSCRIBERS.set(self._subscribers)
+        self._ensure_running()
+        return True
+
+    def release(self):
+        with self._cond:
+            self._subscribers -= 1
+            LIVE_METRICS_SUBSCRIBERS.set(self._subscribers)
+
+    def events(self):
+        """SSE generator for one client holding a :meth:`subscribe` slot."""
+        deadline = time.time() + self.max_duration
+        seen = 0
+        yield f"retry: {int(self.interval * 1000)}\n\n"
+        while time.time() < deadline:
+            with self._cond:
+                self._cond.wait_for(lambda: self._version != seen, timeout=self.interval * 5)
+                seen, payload = self._version, self._payload
+            yield f"data: {payload}\n\n" if payload else ": keep-alive\n\n"
@@ -8,6 +8,65 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 import pickle
 import os
+import time
+
+from corpus import is_corpus, load_corpus
+from quantize import compare_models, quantize
+
+# Longest slice of a message that goes through feature extraction. Very long
+# bodies (e.g. full emails) are scored on their leading text only, which keeps
+# vectorizer cost bounded per message.
+MAX_FEATURE_CHARS = 20000
+# Largest spam-probability change (0-1) a quantized model may introduce on the
+# validation set before save_model refuses to write it.
+DEFAULT_MAX_DRIFT = 0.02
+# Number of n-grams returned per message by predict(..., explain=True)
+DEFAULT_EXPLAIN_TOP_K = 5
+
+def load_dataset(data_path):
+    """Read a v1/v2 labelled CSV, trying several encodings.
+
+    Returns a DataFrame with the message text in ``v2`` and the binary label
+    (0 for ham, 1 for spam) in ``label_num``.
+    """
+    # Try different encodings
+    encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+    df = None
+    
+    for encoding in encodings:
+        try:
+            df = pd.read_csv(data_path, encoding=encoding)
+            # Add a check for required columns
+            if 'v1' not in df.columns or 'v2' not in df.columns:
+                print(f"Encoding {encoding} successful, but missing 'v1' or 'v2' columns.")
+                df = None # Reset df to continue loop
+                continue
+            print(f"Successfully read CSV with encoding: {encoding}")
+            break  # If successful, exit the loop
+        except UnicodeDecodeError:
+            print(f"Failed to decode with {encoding}")
+            continue
+        except Exception as e:
+            print(f"An error occurred with encoding {encoding}: {e}")
+            continue
+    
+    if df is None:
+        raise ValueError("Could not read the CSV file with any of the attempted encodings or required columns 'v1', 'v2' are missing.")
+
+    # Convert labels to binary (0 for ham, 1 for spam)
+    # Ensure 'v1' is treated as string to avoid issues with .map if it contains non-string values
+    df['label_num'] = df['v1'].astype(str).map({'ham': 0, 'spam': 1})
+    
+    # Handle cases where mapping might result in NaN (e.g., unexpected values in 'v1')
+    # Option 1: Drop rows with NaN labels
+    df.dropna(subset=['label_num'], inplace=True)
+    # Option 2: Fill NaN with a default (e.g., 0 for 'ham'), but dropping is safer if labels are unexpected
+    # df['label_num'].fillna(0, inplace=True) 
+
+    # Ensure 'v2' (text messages) is treated as string
+    df['v2'] = df['v2'].astype(str)
+
+    return df
 
 class SpamDetector:
     def __init__(self):
@@ -15,48 +74,33 @@ class SpamDetector:
         self.vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2)) # Using TF-IDF with stop words and n-grams
         self.model = MultinomialNB()
         self.is_trained = False
+        # Optional campaign_index.CampaignIndex used to short-circuit near-duplicates
+        self.campaign_index = None
+        # Optional prefilter.RulePrefilter deciding known signatures up front
+        self.prefilter = None
+        # Optional cascade.Cascade that re-scores uncertain messages
+        self.cascade = None
+        self.quantization_report = None
+        # Per-feature spam log-odds and feature names, built once per fitted/loaded model
+        self.log_odds = None
+        self.feature_names = None
+        # Content hash of the corpus snapshot the model was last trained on
+        self.corpus_hash = None
     
     def train(self, data_path):
-        # Try different encodings
-        encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(data_path, encoding=encoding)
-                # Add a check for required columns
-                if 'v1' not in df.columns or 'v2' not in df.columns:
-                    print(f"Encoding {encoding} successful, but missing 'v1' or 'v2' columns.")
-                    df = None # Reset df to continue loop
-                    continue
-                print(f"Successfully read CSV with encoding: {encoding}")
-                break  # If successful, exit the loop
-            except UnicodeDecodeError:
-                print(f"Failed to decode with {encoding}")
-                continue
-            except Exception as e:
-                print(f"An error occurred with encoding {encoding}: {e}")
-                continue
-        
-        if df is None:
-            raise ValueError("Could not read the CSV file with any of the attempted encodings or required columns 'v1', 'v2' are missing.")
-
-        # Convert labels to binary (0 for ham, 1 for spam)
-        # Ensure 'v1' is treated as string to avoid issues with .map if it contains non-string values
-        df['label_num'] = df['v1'].astype(str).map({'ham': 0, 'spam': 1})
-        
-        # Handle cases where mapping might result in NaN (e.g., unexpected values in 'v1')
-        # Option 1: Drop rows with NaN labels
-        df.dropna(subset=['label_num'], inplace=True)
-        # Option 2: Fill NaN with a default (e.g., 0 for 'ham'), but dropping is safer if labels are unexpected
-        # df['label_num'].fillna(0, inplace=True) 
-
-        # Ensure 'v2' (text messages) is treated as string
-        df['v2'] = df['v2'].astype(str)
+        """Fit on a labelled CSV or a corpus snapshot directory (see corpus.py)."""
+        if is_corpus(data_path):
+            corpus = load_corpus(data_path)
+            texts, labels = corpus.texts(), np.asarray(corpus.labels)
+            self.corpus_hash = corpus.content_hash
+        else:
+            df = load_dataset(data_path)
+            texts, labels = df['v2'], df['label_num']
+            self.corpus_hash = None
 
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
-            df['v2'], df['label_num'], test_size=0.2, random_state=42, stratify=df['label_num'] # Added stratify
+            texts, labels, test_size=0.2, random_state=42, stratify=labels # Added stratify
         )
         
         # Vectorize the text data
@@ -72,10 +116,18 @@ class SpamDetector:
         report = classification_report(y_test, y_pred)
         
         self.is_trained = True
+        self._reset_explanation_table()
         
         return accuracy, report
     
-    def predict(self, text_input): # Renamed 'text' to 'text_input' for clarity
+    def predict(self, text_input, explain=False, top_k=DEFAULT_EXPLAIN_TOP_K): # Renamed 'text' to 'text_input' for clarity
+        """Classify one message (returns a dict) or a list of messages.
+
+        With ``explain`` every model-scored result gets an ``explanation``: the
+        ``top_k`` n-grams with the largest contribution to the spam/ham
+        log-odds, positive weights pushing towards spam. Explained requests
+        bypass the campaign index so each message is actually vectorized.
+        """
         if not self.is_trained:
             # Try to load the model if not trained and model files exist
             if os.path.exists(f"model/vectorizer.pkl") and os.path.exists(f"model/model.pkl"):
@@ -95,41 +147,174 @@ class SpamDetector:
         if not all(isinstance(msg, str) for msg in messages):
             raise ValueError("All items in the input list must be strings.")
             
-        # Vectorize the input text
-        text_vec = self.vectorizer.transform(messages)
+        results = [None] * len(messages)
+        pending = list(range(len(messages)))
+
+        # Known signatures are decided by rule, without vectorizing
+        if self.prefilter is not None:
+            still_pending = []
+            for i in pending:
+                hit = self.prefilter.scan(messages[i])
+                if hit is not None:
+                    results[i] = self._rule_result(messages[i], hit)
+                else:
+                    still_pending.append(i)
+            pending = still_pending
+
+        # Near-duplicates of recent high-confidence verdicts skip the model
+        matches = {}
+        campaign_index = None if explain else self.campaign_index
+        if campaign_index is not None:
+            still_pending = []
+            for i in pending:
+                match, cached = campaign_index.lookup(messages[i])
+                if cached is not None:
+                    cached['text'] = messages[i]
+                    results[i] = cached
+                else:
+                    matches[i] = match
+                    still_pending.append(i)
+            pending = still_pending
+
+        if pending:
+            batch = [messages[i] for i in pending]
+            scored = self._score(batch, explain_top_k=top_k) if explain else self._score(batch)
+            for i, result in zip(pending, scored):
+                if campaign_index is not None:
+                    result = campaign_index.add(matches[i], result)
+                results[i] = result
+        
+        return results[0] if isinstance(text_input, str) else results # Return single dict if single string input
+
+    def _rule_result(self, message, hit):
+        spam_probability = 100.0 if hit.is_spam else 0.0
+        return {
+            'text': message,
+            'is_spam': hit.is_spam,
+            'spam_probability': spam_probability,
+            'ham_probability': 100.0 - spam_probability,
+            'prediction': 'Spam' if hit.is_spam else 'Not Spam',
+            'rule_id': hit.rule_id
+        }
+
+    def _reset_explanation_table(self):
+        # Built on the first explained prediction, so models that are never
+        # asked to explain (e.g. quantized tenant models) do not pay for it
+        self.log_odds = None
+        self.feature_names = None
+
+    def _build_explanation_table(self):
+        # For multinomial NB, log P(spam|x) - log P(ham|x) is a prior term plus
+        # sum_j x_j * (log theta_spam,j - log theta_ham,j), so a feature's
+        # contribution is its (TF-IDF) value times this per-feature log-odds.
+        # Kept at the model's precision, float32 at most.
+        dtype = np.float16 if getattr(self.model, 'precision', None) == 'float16' else np.float32
+        feature_log_prob = self.model.feature_log_prob_
+        feature_names = self.vectorizer.get_feature_names_out()
+        # Names first: a concurrent _explain only checks log_odds
+        self.feature_names = feature_names
+        self.log_odds = (feature_log_prob[1] - feature_log_prob[0]).astype(dtype)
+
+    def _explain(self, text_vec, top_k):
+        """Top-``top_k`` contributing n-grams for each row of ``text_vec``."""
+        if self.log_odds is None:
+            self._build_explanation_table()
+        text_vec = text_vec.tocsr()
+        contributions = text_vec.data * self.log_odds[text_vec.indices]
+        # Sort every row's non-zeros by |contribution| in one pass, keep the first top_k.
+        # The key is row - |contribution| scaled into [0, 0.5], so a single stable
+        # argsort groups rows and orders within them (ties keep column order).
+        rows = np.repeat(np.arange(text_vec.shape[0]), np.diff(text_vec.indptr))
+        magnitude = np.abs(contributions)
+        scale = 2 * magnitude.max() if len(magnitude) else 0.0
+        order = np.argsort(rows - magnitude / scale if scale else rows, kind='stable')
+        rank = np.arange(len(order)) - text_vec.indptr[rows]
+        keep = order[rank < top_k]
+        ngrams = self.feature_names[text_vec.indices[keep]].tolist()
+        weights = np.round(contributions[keep], 4).tolist()
+        bounds = np.concatenate(([0], np.cumsum(np.minimum(np.diff(text_vec.indptr), top_k)))).tolist()
+
+        # Build every entry in one comprehension, then cut it into per-row lists
+        entries = [{'ngram': ngram, 'weight': weight} for ngram, weight in zip(ngrams, weights)]
+        return [entries[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    def _score(self, messages, explain_top_k=None):
+        """Run the vectorizer and classifier (and cascade, if any) over ``messages``."""
+        start = time.perf_counter()
+        # Vectorize the input text (capped so huge bodies stay cheap to score)
+        capped = [msg[:MAX_FEATURE_CHARS] for msg in messages]
+        text_vec = self.vectorizer.transform(capped)
         
         # Predict
         predictions = self.model.predict(text_vec)
         
         # Get probability scores
         probabilities = self.model.predict_proba(text_vec)
+
+        # Uncertain NB verdicts are re-scored by the second stage
+        escalated = None
+        if self.cascade is not None:
+            probabilities, escalated = self.cascade.refine(
+                capped, probabilities, first_stage_seconds=time.perf_counter() - start)
+            predictions = np.where(escalated, probabilities[:, 1] >= 0.5, predictions)
+
+        # Explanations reuse the sparse rows built for scoring (NB stage only)
+        explanations = self._explain(text_vec, explain_top_k) if explain_top_k else None
         
         # Return result as a list of dicts for each input text
         results = []
         for i, pred_label in enumerate(predictions):
             spam_probability = float(probabilities[i][1]) # Probability of being spam (class 1)
-            results.append({
+            result = {
                 'text': messages[i],
                 'is_spam': bool(pred_label),
                 'spam_probability': round(spam_probability * 100, 2), # As percentage
                 'ham_probability': round(float(probabilities[i][0]) * 100, 2), # As percentage
                 'prediction': 'Spam' if pred_label else 'Not Spam'
-            })
-        
-        return results[0] if isinstance(text_input, str) else results # Return single dict if single string input
+            }
+            if escalated is not None:
+                result['stage'] = 'cascade' if escalated[i] else 'nb'
+            if explanations is not None:
+                result['explanation'] = explanations[i]
+            results.append(result)
+        return results
     
-    def save_model(self, path="model"):
+    def save_model(self, path="model", precision="float64", validation_path="spam_dataset.csv",
+                   max_drift=DEFAULT_MAX_DRIFT):
+        """Save the vectorizer and classifier, optionally at reduced precision.
+
+        With ``precision`` other than float64 the weights are quantized (see
+        quantize.py) and compared against the float64 model on
+        ``validation_path``. If the spam probability of any message moves by
+        more than ``max_drift`` (0-1 scale) nothing is written and a
+        ValueError is raised. The comparison report is kept in
+        ``self.quantization_report``.
+        """
         if not self.is_trained:
             raise Exception("Model not trained yet. Call train() first.")
+
+        vectorizer, model = self.vectorizer, self.model
+        if precision != "float64":
+            vectorizer, model = quantize(self.vectorizer, self.model, precision)
+            df = load_dataset(validation_path)
+            report = compare_models((self.vectorizer, self.model), (vectorizer, model),
+                                    df['v2'].tolist(), df['label_num'].to_numpy())
+            report['precision'] = precision
+            self.quantization_report = report
+            if report['max_abs_drift'] > max_drift:
+                raise ValueError(
+                    f"Quantization to {precision} rejected: max probability drift "
+                    f"{report['max_abs_drift']:.4f} exceeds {max_drift} "
+                    f"(accuracy {report['reference_accuracy']:.4f} -> {report['quantized_accuracy']:.4f}).")
         
         os.makedirs(path, exist_ok=True)
         
         # Save vectorizer and model
         with open(f"{path}/vectorizer.pkl", 'wb') as f:
-            pickle.dump(self.vectorizer, f)
+            pickle.dump(vectorizer, f)
         
         with open(f"{path}/model.pkl", 'wb') as f:
-            pickle.dump(self.model, f)
+            pickle.dump(model, f)
     
     def load_model(self, path="model"):
         vectorizer_path = f"{path}/vectorizer.pkl"
@@ -147,6 +332,7 @@ class SpamDetector:
             self.model = pickle.load(f)
         
         self.is_trained = True
+        self._reset_explanation_table()
 
 # Example usage
 if __name__ == "__main__": 
@@ -0,0 +1,173 @@
+# model_manager.py
+"""Lazy, memory-bounded loading of per-tenant / per-channel models.
+
+Models live in a directory tree under ``root``; the routing key is the
+relative path of a model directory (e.g. ``sms/en`` -> ``models/sms/en/``,
+holding ``vectorizer.pkl`` and ``model.pkl``). A model is loaded on first use
+and kept in an LRU that is bounded by the estimated resident size of the
+models, not by their number. Concurrent requests for a model that is still
+loading wait for that one load instead of starting their own.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+MODEL_LOADS = Counter(
+    'spam_detector_model_loads_total', 'Tenant model loads', ['model', 'outcome'])
+MODEL_EVICTIONS = Counter(
+    'spam_detector_model_evictions_total', 'Tenant models evicted from memory', ['model'])
+MODEL_LOAD_SECONDS = Histogram(
+    'spam_detector_model_load_seconds', 'Time to load a tenant model from disk',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+MODEL_RESIDENT_BYTES = Gauge(
+    'spam_detector_model_resident_bytes', 'Estimated resident size of each loaded tenant model', ['model'],
+    multiprocess_mode='livesum')
+MODEL_CACHE_BYTES = Gauge(
+    'spam_detector_model_cache_bytes', 'Estimated resident size of all loaded tenant models',
+    multiprocess_mode='livesum')
+
+_KEY_RE = re.compile(r'^[A-Za-z0-9_-]+(?:/[A-Za-z0-9_-]+)*$')
+
+
+class ModelNotFound(KeyError):
+    pass
+
+
+def _object_bytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, 'data') and hasattr(value, 'indices'):  # scipy sparse
+        return value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def estimate_model_bytes(detector):
+    """Estimate the memory held by a detector's vectorizer and classifier."""
+    total = 0
+    for component in (detector.vectorizer, detector.model):
+        for value in vars(component).values():
+            total += _object_bytes(value)
+        # TfidfVectorizer keeps idf_ on an inner transformer
+        inner = getattr(component, '_tfidf', None)
+        if inner is not None:
+            total += sum(_object_bytes(v) for v in vars(inner).values())
+    # Explanation tables precomputed at load time
+    for table in (getattr(detector, 'log_odds', None), getattr(detector, 'feature_names', None)):
+        if table is not None:
+            total += table.nbytes
+    return total
+
+
+class ModelManager:
+    def __init__(self, root, max_bytes, loader):
+        """``loader(path)`` must return a ready-to-use detector for ``path``."""
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._models = OrderedDict()  # key -> (detector, nbytes), least recently used first
+        self._loading = {}  # key -> threading.Event
+        self._errors = {}
+        self._total_bytes = 0
+
+    def path_for(self, key):
+        if not isinstance(key, str) or not _KEY_RE.match(key):
+            raise ValueError(f"Invalid model key '{key}'")
+        return os.path.join(self.root, *key.split('/'))
+
+    @property
+    def resident_bytes(self):
+        return self._total_bytes
+
+    def resident(self):
+        """Return ``{key: nbytes}`` for loaded models, least recently used first."""
+        with self._lock:
+            return {key: nbytes for key, (_, nbytes) in self._models.items()}
+
+    def _exists(self, path):
+        return (os.path.exists(os.path.join(path, 'model.pkl'))
+                and os.path.exists(os.path.join(path, 'vectorizer.pkl')))
+
+    def get(self, key):
+        path = self.path_for(key)
+        # Keys come from clients: unknown ones are rejected before anything is
+        # cached or labelled with them
+        if key not in self._models and not self._exists(path):
+            MODEL_LOADS.labels(model='unknown', outcome='not_found').inc()
+            raise ModelNotFound(key)
+        while True:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    return entry[0]
+                event = self._loading.get(key)
+                if event is None:
+                    # This thread does the load; others wait on the event
+                    event = self._loading[key] = threading.Event()
+                    break
+            event.wait()
+            with self._lock:
+                error = self._errors.get(key)
+                if error is not None and key not in self._models:
+                    raise error
+
+        try:
+            detector, nbytes = self._load(key, path)
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = e
+                del self._loading[key]
+            event.set()
+            raise
+
+        with self._lock:
+            self._errors.pop(key, None)
+            self._models[key] = (detector, nbytes)
+            self._total_bytes += nbytes
+            MODEL_RESIDENT_BYTES.labels(model=key).set(nbytes)
+            self._evict(keep=key)
+            MODEL_CACHE_BYTES.set(self._total_bytes)
+            del self._loading[key]
+        event.set()
+        return detector
+
+    def _load(self, key, path):
+        start = time.perf_counter()
+        try:
+            detector = self.loader(path)
+        except Exception:
+            MODEL_LOADS.labels(model=key, outcome='error').inc()
+            raise
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - start)
+        MODEL_LOADS.labels(model=key, outcome='success').inc()
+        nbytes = estimate_model_bytes(detector)
+        logger.info(f"Loaded model '{key}' from {path} (~{nbytes / 1e6:.1f} MB)")
+        return detector, nbytes
+
+    def _evict(self, keep):
+        while self._total_bytes > self.max_bytes and len(self._models) > 1:
+            key = next(iter(self._models))
+            if key == keep:
+                break
+            _, nbytes = self._models.pop(key)
+            self._total_bytes -= nbytes
+            MODEL_EVICTIONS.labels(model=key).inc()
+            MODEL_RESIDENT_BYTES.labels(model=key).set(0)  # Removed series linger in multiprocess files
+            MODEL_RESIDENT_BYTES.remove(key)
+            logger.info(f"Evicted model '{key}' (~{nbytes / 1e6:.1f} MB)")
+        if self._total_bytes > self.max_bytes:
+            logger.warning(f"Model '{keep}' alone exceeds the model cache budget of {self.max_bytes} bytes")
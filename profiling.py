@@ -0,0 +1,343 @@
+# profiling.py
+"""On-demand profiling and memory introspection for a live worker.
+
+Nothing here runs until an admin asks for it:
+
+* :class:`SamplingProfiler` samples the stacks of every other thread in the
+  process via ``sys._current_frames()`` for a bounded number of seconds and
+  returns collapsed stacks (``thread;frame;frame count``), the input format
+  of flamegraph.pl and speedscope. Only one profile runs per process at a
+  time, and it runs in the requesting thread, so no thread is left behind.
+* :class:`MemoryTracer` toggles ``tracemalloc`` and diffs each snapshot
+  against the previous one to show where allocations grow. With
+  ``shared_dir`` the toggle is a control file that every worker polls, and a
+  snapshot collects one report per worker (see :meth:`MemoryTracer.collect`).
+* :class:`RouteTimings` aggregates per-route latency while enabled; when
+  disabled the request hook is a single attribute check.
+
+Everything else is per process. Under gunicorn each request reaches one
+worker, so every report carries the ``pid`` it describes.
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+
+import numpy as np
+
+# Leaf frames in these modules are threads parked on a lock, queue or socket
+IDLE_MODULES = ('threading.py', 'selectors.py', 'queue.py', 'socket.py', 'socketserver.py')
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+)
+# Requests that matched no route share one bucket, so 404 scans add no keys
+UNMATCHED = '<unmatched>'
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def snapshot_path(shared_dir, pid):
+    return os.path.join(shared_dir, f"memory_{pid}.json")
+
+
+def _write_json(path, data):
+    # Readers in other workers must never see a half-written file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_duration=30.0, max_depth=128):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    def _collapse(self, frame, thread_name):
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ';'.join(reversed(labels))
+
+    def profile(self, duration, include_idle=False):
+        """Sample all other threads for ``duration`` seconds (capped).
+
+        Returns ``{'pid', 'duration', 'samples', 'interval', 'stacks'}`` where
+        ``stacks`` maps collapsed stacks to sample counts. Raises
+        :class:`ProfilerBusy` if a profile is already running in this process.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running in this worker")
+        try:
+            duration = max(0.0, min(float(duration), self.max_duration))
+            own_thread = threading.get_ident()
+            stacks = Counter()
+            samples = 0
+            start = time.monotonic()
+            deadline = start + duration
+            while True:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                        continue
+                    stacks[self._collapse(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+                samples += 1
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(self.interval)
+            return {
+                'pid': os.getpid(),
+                'duration': round(time.monotonic() - start, 3),
+                'samples': samples,
+                'interval': self.interval,
+                'stacks': dict(stacks.most_common()),
+            }
+        finally:
+            self._lock.release()
+
+
+def collapsed(profile):
+    """Render a profile as collapsed-stack text (one ``stack count`` per line)."""
+    return ''.join(f"{stack} {count}\n" for stack, count in profile['stacks'].items())
+
+
+class MemoryTracer:
+    def __init__(self, frames=10, top=25, shared_dir=None, poll_interval=1.0):
+        self.frames = frames
+        self.top = top
+        self.shared_dir = shared_dir
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._previous = None
+        self._poll_pid = None
+        self._answered = None
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    @property
+    def _control_path(self):
+        return os.path.join(self.shared_dir, 'control.json')
+
+    def start(self, frames=None):
+        """Start tracing; returns False if tracemalloc was already running.
+
+        With ``shared_dir`` the other workers follow on their next poll.
+        """
+        frames = frames or self.frames
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+            if _read_json(self._control_path) is not None:
+                self._start_local(frames)
+                return False
+            _write_json(self._control_path, {'frames': frames, 'request': None})
+        return self._start_local(frames)
+
+    def stop(self):
+        if self.shared_dir:
+            for path in [self._control_path] + glob.glob(snapshot_path(self.shared_dir, '*')):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return self._stop_local()
+
+    def _start_local(self, frames):
+        with self._lock:
+            if tracemalloc.is_tracing():
+                return False
+            tracemalloc.start(frames)
+            self._previous = None
+            return True
+
+    def _stop_local(self):
+        with self._lock:
+            self._previous = None
+            if not tracemalloc.is_tracing():
+                return False
+            tracemalloc.stop()
+            return True
+
+    def ensure_polling(self):
+        """Start the poll thread of this process if it is not running.
+
+        Checked by PID, so a worker forked after the app was imported starts
+        its own thread. Does nothing without ``shared_dir``.
+        """
+        pid = os.getpid()
+        if not self.shared_dir or self._poll_pid == pid:
+            return
+        with self._poll_lock:
+            if self._poll_pid == pid:
+                return
+            self._poll_pid = pid
+        threading.Thread(target=self._poll_loop, name='memory-tracer', daemon=True).start()
+
+    def _poll_loop(self):
+        while True:
+            try:
+                self.poll()
+            except (OSError, RuntimeError):
+                pass
+            time.sleep(self.poll_interval)
+
+    def poll(self):
+        """Follow the control file: start or stop tracing, answer snapshot requests."""
+        control = _read_json(self._control_path)
+        if control is None:
+            self._stop_local()
+            return
+        path = snapshot_path(self.shared_dir, os.getpid())
+        if self._start_local(control['frames']):
+            # Announces this worker, so collect() knows whose report to wait for
+            _write_json(path, {'pid': os.getpid(), 'request': None})
+        request = control['request']
+        with self._poll_lock:
+            if request is None or request['token'] == self._answered:
+                return
+            self._answered = request['token']
+            report = self.snapshot(request['key_type'], top=request['top'])
+            report['request'] = request['token']
+            _write_json(path, report)
+
+    def collect(self, key_type='lineno', top=None, timeout=None):
+        """Snapshot every tracing worker; returns their reports sorted by pid.
+
+        Without ``shared_dir`` this is ``[self.snapshot(...)]``. Otherwise the
+        request goes into the control file and the reports are read back from
+        the per-PID files, waiting at least one poll interval (so every worker
+        has seen the request) and at most ``timeout`` seconds (default three
+        poll intervals) for workers that are slow to answer.
+        """
+        if not self.shared_dir:
+            return [self.snapshot(key_type, top=top)]
+        control = _read_json(self._control_path)
+        if control is None:
+            raise RuntimeError("tracemalloc is not running; start it first")
+        token = uuid.uuid4().hex
+        control['request'] = {'token': token, 'key_type': key_type, 'top': top or self.top}
+        _write_json(self._control_path, control)
+        self.poll()
+
+        start = time.monotonic()
+        timeout = 3 * self.poll_interval if timeout is None else timeout
+        while True:
+            reports = [_read_json(path) for path in glob.glob(snapshot_path(self.shared_dir, '*'))]
+            answered = [report for report in reports if report and report['request'] == token]
+            elapsed = time.monotonic() - start
+            if elapsed >= timeout or (elapsed >= self.poll_interval and len(answered) == len(reports)):
+                return sorted(answered, key=lambda report: report['pid'])
+            time.sleep(min(0.05, self.poll_interval))
+
+    def snapshot(self, key_type='lineno', top=None):
+        """Take a snapshot and report the top allocation sites.
+
+        The first snapshot after :meth:`start` reports absolute sizes; later
+        ones report the growth since the previous snapshot.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running; start it first")
+            snapshot = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+            previous, self._previous = self._previous, snapshot
+            current, peak = tracemalloc.get_traced_memory()
+
+        if previous is None:
+            stats = snapshot.statistics(key_type)
+        else:
+            stats = snapshot.compare_to(previous, key_type)
+
+        entries = []
+        for stat in stats[:top or self.top]:
+            entry = {
+                'traceback': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                'size': stat.size,
+                'count': stat.count,
+            }
+            if previous is not None:
+                entry['size_diff'] = stat.size_diff
+                entry['count_diff'] = stat.count_diff
+            entries.append(entry)
+        return {
+            'pid': os.getpid(),
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'compared_to_previous': previous is not None,
+            'top': entries,
+        }
+
+
+class RouteTimings:
+    def __init__(self, reservoir=2048):
+        self.enabled = False
+        self.reservoir = reservoir
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._since = None
+
+    def enable(self):
+        with self._lock:
+            if not self.enabled:
+                self._routes = {}
+                self._since = time.time()
+            self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            route = self._routes.get(endpoint)
+            if route is None:
+                route = self._routes[endpoint] = {'count': 0, 'total': 0.0, 'max': 0.0,
+                                                  'recent': deque(maxlen=self.reservoir)}
+            route['count'] += 1
+            route['total'] += seconds
+            route['max'] = max(route['max'], seconds)
+            route['recent'].append(seconds)
+
+    def report(self):
+        with self._lock:
+            routes = {endpoint: dict(route, recent=list(route['recent']))
+                      for endpoint, route in self._routes.items()}
+        summary = {}
+        for endpoint, route in routes.items():
+            p50, p95, p99 = np.percentile(route['recent'], [50, 95, 99]) * 1000
+            summary[endpoint] = {
+                'count': route['count'],
+                'mean_ms': round(route['total'] / route['count'] * 1000, 3),
+                'max_ms': round(route['max'] * 1000, 3),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+            }
+        return {'pid': os.getpid(), 'enabled': self.enabled, 'since': self._since, 'routes': summary}
@@ -0,0 +1,116 @@
+# quantize.py
+"""Reduced-precision weights for the TF-IDF + MultinomialNB model.
+
+The fitted ``feature_log_prob_`` matrix and the TF-IDF ``idf_`` vector are
+float64, although the model's ranking barely changes at lower precision.
+:func:`quantize` produces a vectorizer/classifier pair that stores them as
+float32, float16 or int8 (affine, with a per-class scale and offset) and
+scores directly from the reduced-precision tables. :func:`compare_models`
+measures accuracy and probability drift against the float64 model so that
+``SpamDetector.save_model`` can refuse a lossy conversion.
+"""
+import copy
+
+import numpy as np
+from scipy.special import logsumexp
+
+PRECISIONS = ('float64', 'float32', 'float16', 'int8')
+
+
+class QuantizedNB:
+    """Drop-in inference replacement for a fitted ``MultinomialNB``."""
+
+    def __init__(self, model, precision='float32'):
+        if precision not in PRECISIONS[1:]:
+            raise ValueError(f"Unsupported precision '{precision}'. Use one of {PRECISIONS[1:]}.")
+        self.precision = precision
+        self.classes_ = model.classes_
+        self.class_log_prior_ = np.asarray(model.class_log_prior_, dtype=np.float64)
+        self.n_features_in_ = model.feature_log_prob_.shape[1]
+
+        weights = model.feature_log_prob_
+        if precision == 'int8':
+            # Per-class affine mapping of [min, max] onto [-128, 127]
+            low = weights.min(axis=1, keepdims=True)
+            high = weights.max(axis=1, keepdims=True)
+            scale = np.where(high > low, (high - low) / 255.0, 1.0)
+            self._weights = np.round((weights - low) / scale - 128).astype(np.int8)
+            self._scale = scale.ravel()
+            self._offset = (low + 128 * scale).ravel()
+        else:
+            self._weights = weights.astype(precision)
+            self._scale = None
+            self._offset = None
+
+    @property
+    def feature_log_prob_(self):
+        """Dequantized per-class feature log probabilities (float64)."""
+        if self._scale is None:
+            return self._weights.astype(np.float64)
+        return self._weights * self._scale[:, None] + self._offset[:, None]
+
+    @property
+    def nbytes(self):
+        return self._weights.nbytes
+
+    def _joint_log_likelihood(self, X):
+        if self._scale is None:
+            jll = np.asarray(X @ self._weights.T, dtype=np.float64)
+        else:
+            # X @ (q * scale + offset).T == scale * (X @ q.T) + offset * rowsum(X)
+            jll = np.asarray(X @ self._weights.T, dtype=np.float64) * self._scale
+            jll += np.asarray(X.sum(axis=1), dtype=np.float64).reshape(-1, 1) * self._offset
+        return jll + self.class_log_prior_
+
+    def predict_log_proba(self, X):
+        jll = self._joint_log_likelihood(X)
+        return jll - logsumexp(jll, axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        return np.exp(self.predict_log_proba(X))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self._joint_log_likelihood(X), axis=1)]
+
+
+def quantize(vectorizer, model, precision='float32'):
+    """Return a reduced-precision ``(vectorizer, model)`` pair.
+
+    The vectorizer is copied and switched to float32 output (float16 sparse
+    matrices are not supported by scipy); its ``idf_`` vector, when present,
+    is stored as float32.
+    """
+    if precision == 'float64':
+        return vectorizer, model
+
+    q_vectorizer = copy.deepcopy(vectorizer)
+    q_vectorizer.dtype = np.float32
+    if getattr(q_vectorizer, 'use_idf', False) and hasattr(q_vectorizer, 'idf_'):
+        q_vectorizer.idf_ = q_vectorizer.idf_.astype(np.float32)
+    return q_vectorizer, QuantizedNB(model, precision)
+
+
+def compare_models(reference, candidate, texts, labels):
+    """Compare two ``(vectorizer, model)`` pairs on a labelled dataset.
+
+    Returns accuracy of both, the share of identical predictions and the
+    mean/max absolute drift of the spam probability.
+    """
+    ref_vectorizer, ref_model = reference
+    cand_vectorizer, cand_model = candidate
+    labels = np.asarray(labels)
+
+    ref_proba = ref_model.predict_proba(ref_vectorizer.transform(texts))[:, 1]
+    cand_proba = cand_model.predict_proba(cand_vectorizer.transform(texts))[:, 1]
+    ref_pred = ref_model.classes_[(ref_proba >= 0.5).astype(int)]
+    cand_pred = cand_model.classes_[(cand_proba >= 0.5).astype(int)]
+    drift = np.abs(ref_proba - cand_proba)
+
+    return {
+        'samples': int(len(labels)),
+        'reference_accuracy': float(np.mean(ref_pred == labels)),
+        'quantized_accuracy': float(np.mean(cand_pred == labels)),
+        'agreement': float(np.mean(ref_pred == cand_pred)),
+        'mean_abs_drift': float(drift.mean()) if len(drift) else 0.0,
+        'max_abs_drift': float(drift.max()) if len(drift) else 0.0,
+    }
@@ -0,0 +1,161 @@
+# redis_resilience.py
+"""Shared Redis access with bounded pooling, tight timeouts and a circuit breaker.
+
+Caching and rate limiting are optimizations, so a slow or unreachable Redis
+must never stall a request. All commands go through :class:`ResilientRedis`,
+which:
+
+* uses an explicitly sized blocking connection pool with short socket,
+  connect and pool-wait timeouts;
+* counts consecutive failures and, past ``failure_threshold``, opens the
+  circuit so callers skip Redis entirely (fail open) instead of waiting on it;
+* probes Redis in a background thread while open (half-open state) and
+  closes the circuit again as soon as a ``PING`` succeeds.
+"""
+import logging
+import os
+import threading
+import time
+
+import redis
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+REDIS_CIRCUIT_STATE = Gauge(
+    'spam_detector_redis_circuit_state', 'Redis circuit breaker state (0=closed, 1=half-open, 2=open)',
+    multiprocess_mode='livemax')
+REDIS_COMMAND_SECONDS = Histogram(
+    'spam_detector_redis_command_seconds', 'Redis command latency', ['command'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+REDIS_ERRORS = Counter(
+    'spam_detector_redis_errors_total', 'Failed Redis commands', ['command'])
+REDIS_SKIPPED = Counter(
+    'spam_detector_redis_skipped_total', 'Redis commands skipped while the circuit was open', ['command'])
+
+
+class ResilientRedis:
+    def __init__(self, url, max_connections=10, socket_timeout=0.05, connect_timeout=0.1,
+                 pool_timeout=0.05, failure_threshold=3, probe_interval=2.0):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self._pool = redis.BlockingConnectionPool.from_url(
+            url, max_connections=max_connections, timeout=pool_timeout,
+            socket_timeout=socket_timeout, socket_connect_timeout=connect_timeout)
+        self._client = redis.Redis(connection_pool=self._pool)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._state = CLOSED
+        self._probe_thread = None
+        self._probe_pid = None
+        REDIS_CIRCUIT_STATE.set(_STATE_VALUES[CLOSED])
+
+        # Start open if Redis is down at startup; the prober reconnects later
+        if not self._ping():
+            self._open()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+            max_connections=int(os.environ.get('REDIS_MAX_CONNECTIONS', 10)),
+            socket_timeout=float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.05)),
+            connect_timeout=float(os.environ.get('REDIS_CONNECT_TIMEOUT', 0.1)),
+            pool_timeout=float(os.environ.get('REDIS_POOL_TIMEOUT', 0.05)),
+            failure_threshold=int(os.environ.get('REDIS_FAILURE_THRESHOLD', 3)),
+            probe_interval=float(os.environ.get('REDIS_PROBE_INTERVAL', 2.0)),
+        )
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def available(self):
+        """True when commands will actually be sent to Redis."""
+        return self._state == CLOSED
+
+    def _set_state(self, state):
+        self._state = state
+        REDIS_CIRCUIT_STATE.set(_STATE_VALUES[state])
+
+    def _open(self):
+        with self._lock:
+            if self._state != OPEN:
+                self._set_state(OPEN)
+                logger.warning(f"Redis circuit opened after {self._failures} failures; caching and rate limiting bypassed")
+            self._ensure_probe()
+
+    def _ensure_probe(self):
+        # Threads do not survive fork: a worker forked from a master whose
+        # circuit was already open inherits the state but not the prober, so
+        # each process starts its own. Caller holds self._lock.
+        if self._probe_pid != os.getpid() or not self._probe_thread.is_alive():
+            self._probe_pid = os.getpid()
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='redis-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while self._state != CLOSED:
+            time.sleep(self.probe_interval)
+            self._set_state(HALF_OPEN)
+            if self._ping():
+                with self._lock:
+                    self._failures = 0
+                    self._set_state(CLOSED)
+                logger.info("Redis reachable again, circuit closed")
+                return
+            self._set_state(OPEN)
+
+    def _ping(self):
+        try:
+            return bool(self._client.ping())
+        except redis.RedisError:
+            return False
+
+    def execute(self, command, *args, default=None):
+        """Run a Redis command, returning ``default`` if Redis is unavailable."""
+        if self._state != CLOSED:
+            REDIS_SKIPPED.labels(command=command).inc()
+            if self._probe_pid != os.getpid():
+                with self._lock:
+                    self._ensure_probe()
+            return default
+
+        start = time.perf_counter()
+        try:
+            result = getattr(self._client, command)(*args)
+        except redis.RedisError as e:
+            REDIS_ERRORS.labels(command=command).inc()
+            logger.debug(f"Redis {command} failed: {e}")
+            with self._lock:
+                self._failures += 1
+                trip = self._failures >= self.failure_threshold
+            if trip:
+                self._open()
+            return default
+        finally:
+            REDIS_COMMAND_SECONDS.labels(command=command).observe(time.perf_counter() - start)
+
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+        return result
+
+    def get(self, key):
+        return self.execute('get', key)
+
+    def setex(self, key, ttl, value):
+        return self.execute('setex', key, ttl, value)
+
+    def incr(self, key):
+        return self.execute('incr', key)
+
+    def ping(self):
+        return bool(self.execute('ping', default=False))
@@ -0,0 +1,236 @@
+# response_formats.py
+"""Content negotiation and compact encodings for prediction results.
+
+Row-wise JSON repeats every key (and the full input text) for every message,
+which makes large batch responses several times the size of the upload. The
+encoders here offer:
+
+* ``json``     - today's list of objects (default, unchanged)
+* ``columnar`` - one JSON object of column arrays
+* ``ndjson``   - one JSON object per line, streamed
+* ``msgpack``  - columnar, MessagePack encoded (needs ``msgpack``)
+* ``arrow``    - columnar Arrow IPC stream (needs ``pyarrow``)
+
+The format comes from ``?format=`` or the ``Accept`` header, ``include_text=
+false`` drops the echoed input text, and bodies are compressed on the fly
+with gzip or zstd (needs ``zstandard``) according to ``Accept-Encoding``.
+"""
+import json
+import zlib
+from itertools import islice
+
+from flask import Response, jsonify, stream_with_context
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Optional dependency
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+MIMETYPES = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.spam-detector.columnar+json',
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+# Rows serialized per chunk when streaming
+CHUNK_ROWS = 1000
+# Formats that can be written while results are still being produced
+STREAMING_FORMATS = ('json', 'ndjson')
+# Smaller responses are not worth compressing
+COMPRESS_MIN_ROWS = 32
+_COMPRESS_CHUNK_BYTES = 64 * 1024
+# Shared compact encoder; json.dumps() builds a new one per call with custom separators
+_JSON = json.JSONEncoder(separators=(',', ':'))
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def available_formats():
+    formats = ['json', 'columnar', 'ndjson']
+    if msgpack is not None:
+        formats.append('msgpack')
+    if pa is not None:
+        formats.append('arrow')
+    return formats
+
+
+def negotiate_format(req):
+    """Pick a response format from ``?format=`` or the Accept header."""
+    formats = available_formats()
+    requested = req.args.get('format')
+    if requested:
+        if requested not in formats:
+            raise UnsupportedFormat(f"Unsupported format '{requested}'. Available: {', '.join(formats)}")
+        return requested
+
+    by_mimetype = {MIMETYPES[f]: f for f in formats}
+    best = req.accept_mimetypes.best_match(list(by_mimetype), default=MIMETYPES['json'])
+    return by_mimetype.get(best, 'json')
+
+
+def negotiate_encoding(req):
+    """Pick a content coding from Accept-Encoding (zstd preferred over gzip)."""
+    accepted = req.accept_encodings
+    if zstandard is not None and accepted['zstd']:
+        return 'zstd'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def parse_bool(value, default=True):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def to_columns(results, include_text=True):
+    """Turn a list of result dicts into ``{field: [values...]}``."""
+    fields = []
+    seen = set()
+    for result in results:
+        for key in result:
+            if key not in seen and (include_text or key != 'text'):
+                seen.add(key)
+                fields.append(key)
+    return {field: [result.get(field) for result in results] for field in fields}
+
+
+def _without_text(row):
+    row = row.copy()
+    row.pop('text', None)
+    return row
+
+
+def _row_chunks(results, include_text):
+    # Works on any iterable, so a generator of results is never materialized
+    results = iter(results)
+    while True:
+        rows = list(islice(results, CHUNK_ROWS))
+        if not rows:
+            return
+        yield rows if include_text else [_without_text(row) for row in rows]
+
+
+def _json_rows(results, include_text):
+    yield b'['
+    separator = b''
+    for rows in _row_chunks(results, include_text):
+        yield separator + _JSON.encode(rows)[1:-1].encode('utf-8')
+        separator = b','
+    yield b']'
+
+
+def _ndjson(results, include_text):
+    encode_row = _JSON.encode
+    for rows in _row_chunks(results, include_text):
+        yield ('\n'.join(map(encode_row, rows)) + '\n').encode('utf-8')
+
+
+def _columnar_json(results, include_text):
+    body = {'count': len(results), 'columns': to_columns(results, include_text)}
+    yield _JSON.encode(body).encode('utf-8')
+
+
+def _msgpack(results, include_text):
+    body = {'count': len(results), 'columns': to_columns(results, include_text)}
+    yield msgpack.packb(body, use_bin_type=True)
+
+
+def _arrow(results, include_text):
+    table = pa.table(to_columns(results, include_text))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    yield sink.getvalue().to_pybytes()
+
+
+ENCODERS = {
+    'json': _json_rows,
+    'columnar': _columnar_json,
+    'ndjson': _ndjson,
+    'msgpack': _msgpack,
+    'arrow': _arrow,
+}
+
+
+def compress(chunks, encoding):
+    """Compress an iterable of byte chunks incrementally."""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+        flush = compressor.flush
+    else:
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        flush = compressor.flush
+
+    for chunk in chunks:
+        view = memoryview(chunk)
+        for start in range(0, len(view), _COMPRESS_CHUNK_BYTES):
+            data = compressor.compress(view[start:start + _COMPRESS_CHUNK_BYTES])
+            if data:
+                yield data
+    yield flush()
+
+
+def encode(results, fmt='json', include_text=True, encoding=None):
+    """Return the encoded body of ``results`` as an iterator of byte chunks."""
+    chunks = ENCODERS[fmt](results, include_text)
+    if encoding:
+        chunks = compress(chunks, encoding)
+    return chunks
+
+
+def vary(rows):
+    """``Vary`` value of a negotiated response with ``rows`` results.
+
+    The format always depends on Accept; the coding only once there are
+    enough rows to compress.
+    """
+    return 'Accept, Accept-Encoding' if rows >= COMPRESS_MIN_ROWS else 'Accept'
+
+
+def render_results(results, fmt='json', include_text=True, encoding=None):
+    """Build a Flask response for a list of prediction results."""
+    if len(results) < COMPRESS_MIN_ROWS:
+        encoding = None
+    if fmt == 'json' and include_text and encoding is None:
+        response = jsonify(results)  # Unchanged default body
+    else:
+        response = Response(encode(results, fmt, include_text, encoding), mimetype=MIMETYPES[fmt])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    # Shared caches must not serve one client's format or coding to another
+    response.headers['Vary'] = vary(len(results))
+    return response
+
+
+def stream_results(results, fmt='json', include_text=True, encoding=None):
+    """Build a streamed Flask response from an iterable of results.
+
+    Rows are encoded as they are produced, so memory stays bounded however
+    many results there are. Only row-wise formats (``STREAMING_FORMATS``)
+    can be streamed.
+    """
+    if fmt not in STREAMING_FORMATS:
+        raise UnsupportedFormat(f"Format '{fmt}' cannot be streamed. Available: {', '.join(STREAMING_FORMATS)}")
+    response = Response(stream_with_context(encode(results, fmt, include_text, encoding)),
+                        mimetype=MIMETYPES[fmt])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
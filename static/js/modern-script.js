@@ -5,9 +5,9 @@ class SpamDetectorApp {
     constructor() {
         this.apiBaseUrl = window.location.origin;
         this.systemMetrics = {
-            responseTime: 85,
-            requestRate: 1247,
-            cacheHitRate: 87.3,
+            responseTime: null,
+            requestRate: null,
+            cacheHitRate: null,
             healthScore: 100
         };
         this.charts = {};
@@ -489,10 +489,22 @@ class SpamDetectorApp {
     }
 
     startRealTimeUpdates() {
-        // Update system metrics every 5 seconds
-        setInterval(() => {
-            this.updateSystemMetrics();
-        }, 5000);
+        // Live metrics are pushed by the server. Only one tab per browser holds
+        // the stream (via a Web Lock) and relays snapshots to the other tabs.
+        const render = (snapshot) => this.updateSystemMetrics(snapshot);
+        if ('BroadcastChannel' in window && navigator.locks) {
+            const channel = new BroadcastChannel('live-metrics');
+            channel.onmessage = (event) => render(event.data);
+            // The lock is held until this tab closes, then another tab takes over
+            navigator.locks.request('live-metrics-stream', () => new Promise(() => {
+                this.openMetricsStream((snapshot) => {
+                    render(snapshot);
+                    channel.postMessage(snapshot);
+                });
+            }));
+        } else {
+            this.openMetricsStream(render);
+        }
 
         // Update timestamp
         setInterval(() => {
@@ -503,25 +515,58 @@ class SpamDetectorApp {
         }, 30000);
     }
 
-    updateSystemMetrics() {
-        // Simulate real-time metric updates
-        this.systemMetrics.responseTime += (Math.random() - 0.5) * 10;
-        this.systemMetrics.requestRate += (Math.random() - 0.5) * 100;
-        this.systemMetrics.cacheHitRate += (Math.random() - 0.5) * 2;
-        
-        // Ensure values stay within reasonable bounds
-        this.systemMetrics.responseTime = Math.max(50, Math.min(200, this.systemMetrics.responseTime));
-        this.systemMetrics.requestRate = Math.max(500, Math.min(2000, this.systemMetrics.requestRate));
-        this.systemMetrics.cacheHitRate = Math.max(75, Math.min(95, this.systemMetrics.cacheHitRate));
+    openMetricsStream(onSnapshot) {
+        const source = new EventSource(`${this.apiBaseUrl}/api/metrics/stream`);
+        source.onmessage = (event) => {
+            try {
+                onSnapshot(JSON.parse(event.data));
+            } catch (error) {
+                console.error('Invalid live metrics payload:', error);
+            }
+        };
+        source.onerror = () => {
+            // EventSource retries dropped connections itself, but gives up on
+            // HTTP errors (e.g. 503 when the worker has too many streams)
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(() => this.openMetricsStream(onSnapshot), 10000);
+            }
+        };
+    }
+
+    updateSystemMetrics(snapshot) {
+        const latency = snapshot.latency_ms;
+        this.systemMetrics.responseTime = latency.p50;
+        this.systemMetrics.requestRate = snapshot.throughput;
+        this.systemMetrics.cacheHitRate = snapshot.cache_hit_rate;
 
         // Update DOM elements
         const responseTimeEl = document.getElementById('avg-response-time');
+        const responseTimeDetailEl = document.getElementById('avg-response-time-detail');
         const requestRateEl = document.getElementById('request-rate');
+        const requestRateDetailEl = document.getElementById('request-rate-detail');
         const cacheHitRateEl = document.getElementById('cache-hit-rate');
+        const cacheHitRateDetailEl = document.getElementById('cache-hit-rate-detail');
+        // Merged across the gunicorn workers of the pod serving this stream
+        const windowLabel = `last ${snapshot.window_seconds}s, ${snapshot.workers} worker${snapshot.workers === 1 ? '' : 's'}`;
 
-        if (responseTimeEl) responseTimeEl.textContent = `${Math.round(this.systemMetrics.responseTime)}ms`;
-        if (requestRateEl) requestRateEl.textContent = Math.round(this.systemMetrics.requestRate).toLocaleString();
-        if (cacheHitRateEl) cacheHitRateEl.textContent = `${this.systemMetrics.cacheHitRate.toFixed(1)}%`;
+        if (responseTimeEl) {
+            responseTimeEl.textContent = latency.p50 === null ? '—' : `${Math.round(latency.p50)}ms`;
+        }
+        if (responseTimeDetailEl) {
+            responseTimeDetailEl.textContent = latency.p50 === null
+                ? `No requests in ${windowLabel}`
+                : `p95 ${Math.round(latency.p95)}ms · p99 ${Math.round(latency.p99)}ms`;
+        }
+        if (requestRateEl) requestRateEl.textContent = snapshot.throughput.toLocaleString(undefined, {maximumFractionDigits: 1});
+        if (requestRateDetailEl) requestRateDetailEl.textContent = `${snapshot.requests.toLocaleString()} requests, ${windowLabel}`;
+        if (cacheHitRateEl) {
+            cacheHitRateEl.textContent = snapshot.cache_hit_rate === null ? '—' : `${snapshot.cache_hit_rate.toFixed(1)}%`;
+        }
+        if (cacheHitRateDetailEl) {
+            cacheHitRateDetailEl.textContent = snapshot.cache_hit_rate === null
+                ? `No cache lookups in ${windowLabel}`
+                : `Prediction cache, ${windowLabel}`;
+        }
     }
 
     async checkSystemHealth() {
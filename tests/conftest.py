@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model import SpamDetector
+
+TRAINING_CSV = ("v1,v2\nham,See you tomorrow\nspam,WIN FREE MONEY NOW\n"
+                "ham,How are you today\nspam,Claim your FREE prize\n"
+                "ham,Lunch at noon\nspam,URGENT call to claim prize\n")
+
+
+@pytest.fixture(scope="session")
+def training_csv(tmp_path_factory):
+    csv_file = tmp_path_factory.mktemp("data") / "train.csv"
+    csv_file.write_text(TRAINING_CSV)
+    return str(csv_file)
+
+
+@pytest.fixture
+def trained_detector(training_csv):
+    """A detector trained on six messages, fresh for each test so stages can be attached."""
+    detector = SpamDetector()
+    detector.train(training_csv)
+    return detector
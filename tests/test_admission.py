@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+
+import pytest
+from flask import Flask, jsonify
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from admission import INTERACTIVE, LOW, AdmissionController, parse_request_start
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(max_in_flight=2, max_in_flight_low=1,
+                               max_queue_wait=1.0, max_queue_wait_low=0.2, smoothing=1.0)
+
+
+@pytest.fixture
+def admission_client(controller):
+    app = Flask(__name__)
+    controller.init_app(app)
+
+    @app.route('/predict', methods=['POST'])
+    def predict():
+        return jsonify({'in_flight': controller.in_flight})
+
+    @app.route('/predict_batch', methods=['POST'])
+    def predict_batch():
+        return jsonify({'ok': True})
+
+    @app.route('/health')
+    def health():
+        return jsonify({'status': 'healthy'})
+
+    return app.test_client()
+
+
+class TestAdmissionControl:
+    """Test cases for admission control and load shedding."""
+
+    def test_parse_request_start_formats(self):
+        now = 1700000000.0
+        assert parse_request_start('t=1699999999.5', now) == pytest.approx(0.5)
+        assert parse_request_start('1699999999000', now) == pytest.approx(1.0)
+        assert parse_request_start('1699999999750000', now) == pytest.approx(0.25)
+        assert parse_request_start('garbage', now) is None
+
+    def test_low_priority_is_shed_before_interactive(self, controller):
+        assert controller.admit(INTERACTIVE)
+
+        assert not controller.admit(LOW)
+        assert controller.admit(INTERACTIVE)
+        assert not controller.admit(INTERACTIVE)
+
+        controller.release()
+        controller.release()
+        assert controller.in_flight == 0
+
+    def test_counts_admitted_and_shed_requests(self, controller):
+        def count(name):
+            return REGISTRY.get_sample_value(f'spam_detector_{name}_requests_total', {'priority': LOW})
+        admitted, shed = count('admitted'), count('shed')
+
+        assert controller.admit(LOW)
+        assert not controller.admit(LOW)
+
+        assert count('admitted') == admitted + 1
+        assert count('shed') == shed + 1
+
+    def test_queue_wait_sheds_batch_with_retry_after(self, admission_client):
+        start = f"t={time.time() - 0.5:.3f}"
+
+        batch = admission_client.post('/predict_batch', headers={'X-Request-Start': start})
+        interactive = admission_client.post('/predict', headers={'X-Request-Start': start})
+
+        assert batch.status_code == 503
+        assert batch.headers['Retry-After'] == '1'
+        assert interactive.status_code == 200
+        assert interactive.get_json()['in_flight'] == 1
+
+    def test_probes_are_never_shed(self, admission_client, controller):
+        controller.admit(INTERACTIVE)
+        controller.admit(INTERACTIVE)
+
+        assert admission_client.post('/predict').status_code == 503
+        assert admission_client.get('/health').status_code == 200
@@ -168,6 +168,29 @@ class TestFlaskApp:
         assert data['is_spam'] is True
         assert 'spam_probability' in data
     
+    @patch('app.detector')
+    def test_predict_passes_stage_fields_through(self, mock_detector, client):
+        """Test that /predict keeps the fields set by the scoring stages."""
+        mock_detector.predict.return_value = {
+            'text': 'WIN FREE MONEY!', 'prediction': 'Spam', 'is_spam': True,
+            'spam_probability': 0.95, 'rule_id': 'free-money',
+            'campaign_id': 'c1', 'campaign_size': 3, 'campaign_hit': True, 'stage': 'nb'
+        }
+        mock_detector.is_trained = True
+
+        with patch('app.redis_client', MagicMock(available=False)):
+            plain = client.post('/predict', json={'message': 'WIN FREE MONEY!'})
+            mock_detector.predict.return_value = {
+                'text': 'Hi', 'prediction': 'Ham', 'is_spam': False, 'spam_probability': 0.1}
+            bare = client.post('/predict', json={'message': 'Hi'})
+
+        assert plain.status_code == 200
+        data = plain.get_json()
+        assert data['rule_id'] == 'free-money'
+        assert (data['campaign_id'], data['campaign_size'], data['campaign_hit']) == ('c1', 3, True)
+        assert data['stage'] == 'nb'
+        assert not {'rule_id', 'campaign_id', 'stage'} & set(bare.get_json())
+
     def test_predict_api_missing_message(self, client):
         """Test prediction API with missing message."""
         response = client.post('/predict', json={})
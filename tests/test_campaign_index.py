@@ -0,0 +1,105 @@
+import os
+import sys
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from campaign_index import CampaignIndex
+
+WINNER_A = ("WINNER!! As a valued network customer you have been selected to receivea "
+            "£900 prize reward! To claim call 09061701461. Claim code KL341. Valid 12 hours only.")
+WINNER_B = ("WINNER!! As a valued network customer you have been selected to receivea "
+            "£500 prize reward! To claim call 09061701999. Claim code KL341. Valid 12 hours only.")
+HAM = "Nah I don't think he goes to usf, he lives around here though"
+
+
+def _verdict(text, spam_probability):
+    return {
+        'text': text,
+        'is_spam': spam_probability >= 50,
+        'spam_probability': spam_probability,
+        'ham_probability': round(100 - spam_probability, 2),
+        'prediction': 'Spam' if spam_probability >= 50 else 'Not Spam'
+    }
+
+
+class TestCampaignIndex:
+    """Test cases for the near-duplicate campaign index."""
+
+    def test_near_duplicate_reuses_confident_verdict(self):
+        index = CampaignIndex()
+        match, cached = index.lookup(WINNER_A)
+        assert cached is None
+        first = index.add(match, _verdict(WINNER_A, 99.5))
+
+        _, cached = index.lookup(WINNER_B)
+
+        assert cached is not None
+        assert cached['campaign_hit'] is True
+        assert cached['campaign_id'] == first['campaign_id']
+        assert cached['campaign_size'] == 2
+        assert cached['prediction'] == 'Spam'
+
+    def test_unrelated_message_is_not_matched(self):
+        index = CampaignIndex()
+        match, _ = index.lookup(WINNER_A)
+        first = index.add(match, _verdict(WINNER_A, 99.5))
+
+        match, cached = index.lookup(HAM)
+        second = index.add(match, _verdict(HAM, 1.0))
+
+        assert cached is None
+        assert second['campaign_id'] != first['campaign_id']
+        assert second['campaign_size'] == 1
+
+    def test_low_confidence_verdict_joins_campaign_without_reuse(self):
+        index = CampaignIndex()
+        match, _ = index.lookup(WINNER_A)
+        first = index.add(match, _verdict(WINNER_A, 60.0))
+
+        match, cached = index.lookup(WINNER_B)
+        second = index.add(match, _verdict(WINNER_B, 62.0))
+
+        assert cached is None
+        assert second['campaign_id'] == first['campaign_id']
+        assert second['campaign_size'] == 2
+
+    def test_short_messages_are_not_indexed(self):
+        index = CampaignIndex()
+        match, cached = index.lookup("Hello friend")
+        result = index.add(match, _verdict("Hello friend", 1.0))
+
+        assert match is None and cached is None
+        assert result['campaign_id'] is None and result['campaign_hit'] is False
+        assert len(index) == 0
+        assert index.lookup("hello") == (None, None)
+
+    def test_entries_expire_and_are_bounded(self):
+        index = CampaignIndex(ttl=10, max_entries=2)
+        with patch('campaign_index.time.time', return_value=1000.0):
+            for i in range(3):
+                text = f"completely different message number {'x' * i} about topic {chr(97 + i) * 5}"
+                match, _ = index.lookup(text)
+                index.add(match, _verdict(text, 1.0))
+            assert len(index) == 2
+
+        with patch('campaign_index.time.time', return_value=1011.0):
+            _, cached = index.lookup(WINNER_A)
+            assert cached is None
+            assert len(index) == 0
+        assert REGISTRY.get_sample_value('spam_detector_campaign_index_entries') == 0
+
+    def test_detector_short_circuits_duplicates(self, trained_detector):
+        detector = trained_detector
+        detector.campaign_index = CampaignIndex(confidence=0)
+
+        first = detector.predict(WINNER_A)
+        with patch.object(detector, '_score', side_effect=AssertionError("model should be skipped")):
+            second = detector.predict(WINNER_B)
+
+        assert first['campaign_hit'] is False
+        assert second['campaign_hit'] is True
+        assert second['text'] == WINNER_B
+        assert second['prediction'] == first['prediction']
@@ -0,0 +1,76 @@
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cascade import Cascade, load_second_stage
+
+
+@pytest.fixture
+def stand_in_path(tmp_path):
+    """A tiny pickled second-stage model that is confident about 'prize'."""
+    pipeline = make_pipeline(CountVectorizer(), LogisticRegression(C=100))
+    pipeline.fit(["claim your prize", "prize winner", "see you at lunch", "call me later"],
+                 [1, 1, 0, 0])
+    path = tmp_path / "second_stage.pkl"
+    with open(path, 'wb') as f:
+        pickle.dump(pipeline, f)
+    return str(path)
+
+
+class SlowStage:
+    def predict_proba(self, texts):
+        time.sleep(0.5)
+        return np.tile([0.0, 1.0], (len(texts), 1))
+
+
+class TestCascade:
+    """Test cases for the two-stage cascade."""
+
+    def test_only_uncertain_rows_are_escalated(self, stand_in_path):
+        cascade = Cascade(load_second_stage(stand_in_path), low=0.3, high=0.7, batch_size=1)
+        probabilities = np.array([[0.95, 0.05], [0.5, 0.5], [0.1, 0.9]])
+
+        refined, escalated = cascade.refine(["hi", "prize winner", "spam"], probabilities)
+
+        assert escalated.tolist() == [False, True, False]
+        assert refined[1, 1] > 0.9
+        assert refined[0].tolist() == [0.95, 0.05]
+
+    def test_timeout_keeps_first_stage_verdict(self):
+        cascade = Cascade(SlowStage(), low=0.0, high=1.0, timeout=0.05)
+        probabilities = np.array([[0.6, 0.4]])
+
+        refined, escalated = cascade.refine(["hello"], probabilities)
+
+        assert not escalated.any()
+        assert refined.tolist() == probabilities.tolist()
+
+    def test_timeout_is_one_deadline_for_all_batches(self):
+        cascade = Cascade(SlowStage(), low=0.0, high=1.0, batch_size=1, timeout=0.2)
+        probabilities = np.tile([0.6, 0.4], (3, 1))
+
+        start = time.perf_counter()
+        refined, escalated = cascade.refine(["a", "b", "c"], probabilities)
+
+        assert time.perf_counter() - start < 0.4
+        assert not escalated.any()
+        assert refined.tolist() == probabilities.tolist()
+
+    def test_detector_reports_stage(self, trained_detector, stand_in_path):
+        detector = trained_detector
+        detector.cascade = Cascade(load_second_stage(stand_in_path), low=0.0, high=1.0)
+
+        result = detector.predict("prize winner")
+
+        assert result['stage'] == 'cascade'
+        assert result['prediction'] == 'Spam'
+        assert result['spam_probability'] > 90
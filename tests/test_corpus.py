@@ -0,0 +1,93 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import build_corpus, clean_text, ensure_corpus, is_stale
+from model import SpamDetector
+
+DATASET = ("v1,v2,,,\n"
+           "ham,See you tomorrow,,,\n"
+           "spam,WIN FREE MONEY NOW,,,\n"
+           "ham,See  you tomorrow,,,\n"
+           "ham,How are you today,,,\n"
+           "spam,Claim your FREE prize,,,\n"
+           "ham,Lunch at noon,,,\n"
+           "spam,URGENT call to claim prize,,,\n"
+           "ham,Are we still on for lunch,,,\n"
+           "spam,FREE prize waiting claim now,,,\n"
+           "ham,Caf\xe9 later?,,,\n")
+FEEDBACK = ("message,predicted_as,user_marked_as_actual\n"
+            "\"ham\tLunch at noon\",Not Spam,spam\n"
+            "Lunch at noon,Not Spam,ham\n"
+            "spam\tCheap meds online now,Not Spam,spam\n"
+            "Something,Spam,maybe\n")
+
+
+@pytest.fixture
+def sources(tmp_path):
+    dataset = tmp_path / "spam_dataset.csv"
+    dataset.write_bytes(DATASET.encode('latin1'))
+    feedback = tmp_path / "feedback_data.csv"
+    feedback.write_text(FEEDBACK, encoding='utf-8')
+    return str(dataset), str(feedback), str(tmp_path / "corpus")
+
+
+class TestCorpus:
+    """Test cases for the training-corpus snapshot."""
+
+    def test_clean_text_strips_pasted_label(self):
+        assert clean_text("ham\tHey, lunch at 2pm?") == "Hey, lunch at 2pm?"
+        assert clean_text("  Spam\tWin now ") == "Win now"
+        assert clean_text("hamster\tdance") == "hamster\tdance"
+
+    def test_dedupe_and_feedback_merge(self, sources):
+        corpus = build_corpus(*sources)
+        texts = corpus.texts()
+        by_text = dict(zip(texts, corpus.labels.tolist()))
+
+        assert len(texts) == 10  # 10 rows - 1 whitespace duplicate + 1 new feedback message
+        assert texts.count("See you tomorrow") == 1
+        assert by_text["Lunch at noon"] == 0  # latest feedback wins
+        assert by_text["Cheap meds online now"] == 1
+        assert "Café later?" in texts
+        assert corpus.manifest['count'] == 10
+
+    def test_rebuilds_only_when_a_source_changes(self, sources):
+        dataset, feedback, out_dir = sources
+        first = ensure_corpus(dataset, feedback, out_dir)
+        mtime = os.path.getmtime(os.path.join(out_dir, 'manifest.json'))
+
+        again = ensure_corpus(dataset, feedback, out_dir)
+        assert again.content_hash == first.content_hash
+        assert os.path.getmtime(os.path.join(out_dir, 'manifest.json')) == mtime
+
+        with open(feedback, 'a', encoding='utf-8') as f:
+            f.write("Totally new message,Not Spam,ham\n")
+        assert is_stale(out_dir, dataset, feedback)
+        rebuilt = ensure_corpus(dataset, feedback, out_dir)
+        assert rebuilt.content_hash != first.content_hash
+        assert len(rebuilt) == len(first) + 1
+
+    def test_build_is_deterministic(self, sources, tmp_path):
+        dataset, feedback, out_dir = sources
+        a = build_corpus(dataset, feedback, out_dir)
+        b = build_corpus(dataset, feedback, str(tmp_path / "other"))
+
+        assert a.content_hash == b.content_hash
+        with open(os.path.join(out_dir, 'texts.bin'), 'rb') as fa, \
+                open(str(tmp_path / "other" / "texts.bin"), 'rb') as fb:
+            assert fa.read() == fb.read()
+
+    def test_training_from_snapshot_is_reproducible(self, sources):
+        corpus = ensure_corpus(*sources)
+        first, second = SpamDetector(), SpamDetector()
+        first.train(corpus.path)
+        second.train(corpus.path)
+
+        assert first.corpus_hash == corpus.content_hash
+        assert np.array_equal(first.model.feature_log_prob_, second.model.feature_log_prob_)
+        assert first.predict("Claim your FREE prize now")['is_spam']
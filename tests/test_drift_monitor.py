@@ -0,0 +1,114 @@
+import math
+import os
+import sys
+
+import pytest
+from prometheus_client import REGISTRY
+from sklearn.feature_extraction.text import CountVectorizer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from drift_monitor import CountMinSketch, DriftMonitor
+from model import MAX_FEATURE_CHARS
+
+
+def verdict(probability, text="hello there"):
+    return {'text': text, 'is_spam': probability >= 50, 'spam_probability': probability,
+            'ham_probability': 100 - probability, 'prediction': 'Spam' if probability >= 50 else 'Not Spam'}
+
+
+class TestDriftMonitor:
+    """Test cases for the streaming drift monitor."""
+
+    def test_count_min_sketch_never_underestimates(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        for i in range(500):
+            sketch.add(f"token{i % 50}")
+
+        assert all(sketch.estimate(f"token{i}") >= 10 for i in range(50))
+        sketch.decay()
+        assert sketch.estimate("token0") >= 5
+
+    def test_spam_rate_and_window_expiry(self):
+        monitor = DriftMonitor(window=600, bucket_seconds=60, reference_size=10)
+        monitor.observe([verdict(90)] * 3 + [verdict(10)], now=1000.0)
+
+        assert monitor.snapshot(now=1000.0)['spam_rate'] == 0.75
+        assert monitor.snapshot(now=1000.0 + 700)['predictions'] == 0
+
+    def test_psi_alerts_on_shifted_distribution(self):
+        monitor = DriftMonitor(reference_size=200, min_samples=100, bucket_seconds=60, window=600)
+        monitor.observe([verdict(p) for p in range(0, 100, 1)] * 2, now=0.0)
+        assert monitor.reference_ready
+        monitor.observe([verdict(p) for p in range(0, 100, 1)] * 2, now=3600.0)
+        stable = monitor.snapshot(now=3600.0)
+
+        monitor.observe([verdict(99)] * 200, now=7200.0)
+        shifted = monitor.snapshot(now=7200.0)
+
+        assert stable['probability_psi'] < 0.05
+        assert shifted['probability_psi'] > 1.0
+        assert monitor.alerts(shifted)['probability_psi']
+        assert monitor.alerts(shifted)['spam_rate_shift']
+
+    def test_rule_hits_do_not_shift_the_spam_rate(self):
+        # Stationary traffic: 30% spam, 70% of it caught by rules before the model
+        def traffic():
+            for i in range(100):
+                if i < 21:
+                    yield dict(verdict(100), rule_id='shortcode-call-to-action')
+                elif i < 30:
+                    yield verdict(90)
+                else:
+                    yield verdict(10)
+
+        monitor = DriftMonitor(reference_size=200, min_samples=50, bucket_seconds=60, window=600)
+        monitor.observe([verdict(90)] * 26 + [verdict(10)] * 174, now=0.0)  # training-like model mix
+        monitor.observe(list(traffic()) * 3, now=3600.0)
+        snapshot = monitor.snapshot(now=3600.0)
+
+        assert snapshot['predictions'] == 300
+        assert snapshot['spam_rate_shift'] < 0.05
+        assert not monitor.alerts(snapshot)['spam_rate_shift']
+
+    def test_unseen_tokens_against_vocabulary(self):
+        vectorizer = CountVectorizer().fit(["free prize claim now", "see you at lunch"])
+        monitor = DriftMonitor(token_sample_rate=1.0, recurring_min=2, min_samples=1)
+
+        monitor.observe([verdict(80, "free crypto prize"), verdict(80, "crypto airdrop")],
+                        vectorizer=vectorizer, now=0.0)
+        snapshot = monitor.snapshot(now=0.0)
+
+        assert snapshot['tokens'] == 5
+        assert snapshot['unseen_token_rate'] == pytest.approx(3 / 5)
+        assert snapshot['recurring_unseen_token_rate'] == pytest.approx(1 / 5)
+
+    def test_only_featurized_head_is_tokenized(self):
+        vectorizer = CountVectorizer().fit(["free prize claim now"])
+        monitor = DriftMonitor(token_sample_rate=1.0)
+        head = "free prize " * (MAX_FEATURE_CHARS // len("free prize "))
+
+        monitor.observe([verdict(80, head + " crypto airdrop" * 1000)], vectorizer=vectorizer, now=0.0)
+        snapshot = monitor.snapshot(now=0.0)
+
+        assert snapshot['tokens'] == head.count("free") * 2
+        assert snapshot['unseen_token_rate'] == 0
+
+    def test_rule_hits_skip_model_statistics(self):
+        monitor = DriftMonitor(reference_size=10)
+        monitor.observe([dict(verdict(100), rule_id='claim-code'), verdict(20)], now=0.0)
+        snapshot = monitor.snapshot(now=0.0)
+
+        assert snapshot['predictions'] == 2
+        assert sum(snapshot['probability_histogram']) == 1
+
+    def test_feedback_disagreement_rate_and_metrics(self):
+        monitor = DriftMonitor(min_feedback=4, thresholds={'feedback_disagreement_rate': 0.4},
+                               export_interval=0)
+        for predicted, actual in [(True, True), (True, False), (False, True), (False, False)]:
+            monitor.observe_feedback(predicted, actual)
+
+        assert monitor.snapshot()['feedback_disagreement_rate'] == 0.5
+        assert REGISTRY.get_sample_value(
+            'spam_detector_drift_alert', {'signal': 'feedback_disagreement_rate'}) == 1.0
+        assert math.isnan(REGISTRY.get_sample_value('spam_detector_drift_signal', {'signal': 'probability_psi'}))
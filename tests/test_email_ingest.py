@@ -0,0 +1,128 @@
+import io
+import json
+import os
+import sys
+from unittest.mock import patch
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from email_ingest import iter_mbox, parse_eml, parse_message_bytes, predict_stream
+
+MBOX = b"""From alice@example.com Mon Jan  1 00:00:00 2024
+Subject: Lunch
+Content-Type: text/plain; charset=utf-8
+
+Are we still on for lunch?
+>From the office, I mean.
+
+From promo@example.com Mon Jan  1 00:01:00 2024
+Subject: WINNER
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="XYZ"
+
+--XYZ
+Content-Type: text/plain; charset=utf-8
+Content-Transfer-Encoding: base64
+
+Q2xhaW0geW91ciBwcml6ZSBub3cgY2FsbCAwOTA2MTcwMTQ2MQ==
+
+--XYZ
+Content-Type: application/octet-stream
+Content-Disposition: attachment; filename="prize.bin"
+Content-Transfer-Encoding: base64
+
+AAAAAAAAAAAAAAAA
+
+--XYZ--
+"""
+
+
+class TestEmailIngest:
+    """Test cases for streaming email parsing."""
+
+    def test_iter_mbox_splits_and_decodes(self):
+        texts = list(iter_mbox(io.BytesIO(MBOX)))
+
+        assert len(texts) == 2
+        assert texts[0] == 'Lunch Are we still on for lunch? From the office, I mean.'
+        # Base64 body decoded, attachment skipped
+        assert texts[1] == 'WINNER Claim your prize now call 09061701461'
+
+    def test_html_only_email_is_stripped(self):
+        raw = (b"Subject: Offer\nContent-Type: text/html\n\n"
+               b"<html><style>p {}</style><p>Free&nbsp;entry <b>now</b></p></html>\n")
+        text = parse_eml(io.BytesIO(raw))
+
+        assert 'Free' in text and 'now' in text
+        assert '<' not in text and 'p {}' not in text
+
+    def test_long_body_is_capped(self):
+        raw = "Subject: Long\n\n" + "word " * 50000
+        text = parse_message_bytes(raw, max_chars=1000)
+
+        assert len(text) <= 1000
+
+    def test_predict_stream_batches(self):
+        calls = []
+
+        class FakeDetector:
+            def predict(self, batch):
+                calls.append(len(batch))
+                return [{'text': t} for t in batch]
+
+        results = list(predict_stream(FakeDetector(), (str(i) for i in range(5)), batch_size=2))
+
+        assert [r['text'] for r in results] == ['0', '1', '2', '3', '4']
+        assert calls == [2, 2, 1]
+
+    def test_predict_route_scores_long_raw_email(self, trained_detector):
+        import app as app_module
+
+        raw = ("From: promo@example.com\nSubject: WINNER claim your FREE prize\n"
+               "Content-Type: text/plain; charset=utf-8\n\n" + "Claim your FREE prize now. " * 200)
+        assert len(raw) > 1000
+
+        with patch.object(app_module, 'detector', trained_detector):
+            response = app_module.app.test_client().post('/predict', json={'message': raw, 'format': 'email'})
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['is_spam'] is True
+        assert body['text'].startswith('WINNER claim your FREE prize')
+
+    def test_mailbox_upload_is_streamed(self):
+        import app as app_module
+        from email_ingest import DEFAULT_BATCH_SIZE
+
+        consumed = []
+
+        def fake_mailbox(path):
+            for i in range(6 * DEFAULT_BATCH_SIZE):
+                consumed.append(i)
+                yield f"message {i}"
+
+        class FakeDetector:
+            vectorizer = None
+
+            def predict(self, batch):
+                return [{'text': t, 'is_spam': False, 'spam_probability': 1.0,
+                         'ham_probability': 99.0, 'prediction': 'Not Spam'} for t in batch]
+
+        client = app_module.app.test_client()
+        with patch.object(app_module, 'iter_email_file', fake_mailbox), \
+                patch.object(app_module, 'detector', FakeDetector()):
+            response = client.post('/predict_batch?format=ndjson&include_text=false',
+                                   data={'file': (io.BytesIO(MBOX), 'inbox.mbox')})
+            assert response.status_code == 200
+            assert len(consumed) < 6 * DEFAULT_BATCH_SIZE  # scored as the body is read, not up front
+            lines = response.get_data(as_text=True).splitlines()
+            response.close()
+
+        assert len(consumed) == len(lines) == 6 * DEFAULT_BATCH_SIZE
+        assert 'text' not in json.loads(lines[0])
+
+        with patch.object(app_module, 'detector', FakeDetector()):
+            columnar = client.post('/predict_batch?format=columnar',
+                                   data={'file': (io.BytesIO(MBOX), 'inbox.mbox')})
+        assert columnar.status_code == 406
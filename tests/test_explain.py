@@ -0,0 +1,88 @@
+import os
+import sys
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from campaign_index import CampaignIndex
+
+
+class TestExplain:
+    """Test cases for log-odds prediction explanations."""
+
+    def test_contributions_add_up_to_model_log_odds(self, trained_detector):
+        message = "Claim your FREE prize at lunch"
+        result = trained_detector.predict(message, explain=True, top_k=50)
+
+        row = trained_detector.vectorizer.transform([message])
+        joint = trained_detector.model.predict_joint_log_proba(row)[0]
+        prior = trained_detector.model.class_log_prior_[1] - trained_detector.model.class_log_prior_[0]
+        total = sum(item['weight'] for item in result['explanation'])
+
+        assert total + prior == pytest.approx(joint[1] - joint[0], abs=1e-3)
+
+    def test_top_k_sorted_by_magnitude(self, trained_detector):
+        result = trained_detector.predict("Claim your FREE prize now, see you at lunch", explain=True, top_k=2)
+
+        weights = [item['weight'] for item in result['explanation']]
+        assert len(weights) == 2
+        assert abs(weights[0]) >= abs(weights[1])
+        assert result['explanation'][0]['ngram'] in trained_detector.feature_names
+
+    def test_batch_rows_and_empty_messages(self, trained_detector):
+        results = trained_detector.predict(["FREE prize", "", "See you tomorrow"], explain=True, top_k=3)
+
+        assert results[0]['explanation'][0]['weight'] > 0
+        assert results[1]['explanation'] == []
+        assert all(item['weight'] < 0 for item in results[2]['explanation'])
+
+    def test_table_is_built_lazily_in_float32(self, trained_detector):
+        assert trained_detector.log_odds is None
+        trained_detector.predict("FREE prize", explain=True)
+        assert trained_detector.log_odds.dtype == np.float32
+
+    def test_not_explained_by_default(self, trained_detector):
+        assert 'explanation' not in trained_detector.predict("FREE prize")
+
+    def test_explained_requests_bypass_campaign_index(self, trained_detector):
+        trained_detector.campaign_index = CampaignIndex(confidence=0.0)
+        try:
+            trained_detector.predict("Claim your FREE prize now")
+            cached = trained_detector.predict("Claim your FREE prize now")
+            explained = trained_detector.predict("Claim your FREE prize now", explain=True)
+        finally:
+            trained_detector.campaign_index = None
+
+        assert cached['campaign_hit'] is True
+        assert 'campaign_id' not in explained
+        assert explained['explanation']
+
+    def test_api_predict_explain_option(self, trained_detector):
+        import app as app_module
+        client = app_module.app.test_client()
+
+        with patch.object(app_module, 'detector', trained_detector):
+            response = client.post('/api/predict', json={'message': 'FREE prize', 'explain': True, 'top_k': 1})
+            invalid = client.post('/api/predict', json={'message': 'FREE prize', 'explain': True, 'top_k': 0})
+
+        assert response.status_code == 200
+        assert len(response.get_json()['explanation']) == 1
+        assert invalid.status_code == 400
+
+    def test_predict_route_explain_option(self, trained_detector):
+        import app as app_module
+        client = app_module.app.test_client()
+
+        with patch.object(app_module, 'detector', trained_detector):
+            plain = client.post('/predict', json={'message': 'Claim your FREE prize now'})
+            explained = client.post('/predict', json={'message': 'Claim your FREE prize now',
+                                                      'explain': True, 'top_k': 2})
+
+        assert plain.status_code == 200
+        assert plain.get_json()['is_spam'] is True
+        assert 'explanation' not in plain.get_json()
+        assert explained.status_code == 200
+        assert len(explained.get_json()['explanation']) == 2
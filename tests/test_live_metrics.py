@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from live_metrics import LiveMetrics, LiveMetricsStream
+
+
+class TestLiveMetrics:
+    """Test cases for the rolling-window dashboard metrics."""
+
+    def test_snapshot_quantiles_and_cache_rate(self):
+        metrics = LiveMetrics(window=10)
+        now = 1000.0
+        for i in range(100):
+            metrics.record((i + 1) / 1000.0, cache_hit=(i % 4 == 0), now=now)
+
+        snapshot = metrics.snapshot(now=now)
+
+        assert snapshot['requests'] == 100
+        assert snapshot['throughput'] == 10.0
+        assert snapshot['latency_ms']['p50'] == pytest.approx(50, rel=0.05)
+        assert snapshot['latency_ms']['p99'] == pytest.approx(99, rel=0.05)
+        assert snapshot['cache_hit_rate'] == 25.0
+
+    def test_old_seconds_fall_out_of_window(self):
+        metrics = LiveMetrics(window=10)
+        metrics.record(0.01, now=1000.0)
+        metrics.record(0.02, now=1005.0)
+
+        assert metrics.snapshot(now=1009.0)['requests'] == 2
+        assert metrics.snapshot(now=1012.0)['requests'] == 1
+        empty = metrics.snapshot(now=1100.0)
+        assert empty['requests'] == 0
+        assert empty['latency_ms']['p50'] is None
+        assert empty['cache_hit_rate'] is None
+
+    def test_stream_shares_payload_and_caps_subscribers(self):
+        metrics = LiveMetrics(window=10)
+        metrics.record(0.05)
+        stream = LiveMetricsStream(metrics, interval=0.01, max_subscribers=2, max_duration=5)
+
+        assert stream.subscribe()
+        assert stream.subscribe()
+        assert not stream.subscribe()
+
+        first, second = stream.events(), stream.events()
+        assert next(first).startswith('retry:')
+        next(second)
+        payload_a = next(first)
+        payload_b = next(second)
+
+        assert json.loads(payload_a[len('data: '):])['requests'] == 1
+        assert payload_a.startswith('data: ') and payload_b.startswith('data: ')
+
+        first.close()
+        stream.release()
+        assert stream.subscribe()
+
+    def test_head_request_does_not_leak_a_stream_slot(self):
+        from unittest.mock import patch
+
+        import app as app_module
+        stream = LiveMetricsStream(LiveMetrics(window=10), interval=0.01, max_subscribers=1, max_duration=0)
+        client = app_module.app.test_client()
+
+        with patch.object(app_module, 'live_metrics_stream', stream):
+            for _ in range(2):
+                head = client.head('/api/metrics/stream')
+                head.close()  # as the WSGI server does once the (empty) body is sent
+                assert head.status_code == 200
+            response = client.get('/api/metrics/stream')
+            assert response.status_code == 200
+            assert response.get_data(as_text=True).startswith('retry:')
+            response.close()
+
+        assert stream._subscribers == 0
+
+    def test_shared_dir_merges_worker_tables(self, tmp_path):
+        from unittest.mock import patch
+
+        metrics = LiveMetrics(window=10, shared_dir=str(tmp_path))
+        with patch('live_metrics.os.getpid', return_value=101):
+            metrics.record(0.01, now=1000.0)
+        with patch('live_metrics.os.getpid', return_value=102):
+            metrics.record(0.02, cache_hit=True, now=1000.0)
+            metrics.record(0.03, now=1001.0)
+            snapshot = metrics.snapshot(now=1001.0)
+
+        assert snapshot['workers'] == 2
+        assert snapshot['requests'] == 3
+        assert snapshot['cache_hit_rate'] == 100.0
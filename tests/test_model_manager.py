@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model import SpamDetector
+from model_manager import ModelManager, ModelNotFound, estimate_model_bytes
+
+
+@pytest.fixture
+def model_root(tmp_path, trained_detector):
+    for key in ('sms/en', 'sms/fr', 'email'):
+        trained_detector.save_model(str(tmp_path.joinpath(*key.split('/'))))
+    return tmp_path
+
+
+def load(path):
+    detector = SpamDetector()
+    detector.load_model(path)
+    return detector
+
+
+class TestModelManager:
+    """Test cases for lazy, size-bounded tenant model loading."""
+
+    def test_loads_lazily_and_reuses(self, model_root):
+        calls = []
+        manager = ModelManager(str(model_root), max_bytes=10**9, loader=lambda p: calls.append(p) or load(p))
+
+        assert manager.resident() == {}
+        first = manager.get('sms/en')
+        assert manager.get('sms/en') is first
+        assert len(calls) == 1
+        assert first.predict("WIN FREE MONEY NOW")['is_spam']
+
+    def test_rejects_unsafe_and_unknown_keys(self, model_root):
+        manager = ModelManager(str(model_root), max_bytes=10**9, loader=load)
+
+        for key in ('../model', '/etc', 'sms//en', 'sms/en/', ''):
+            with pytest.raises(ValueError):
+                manager.get(key)
+        with pytest.raises(ModelNotFound):
+            manager.get('sms/de')
+
+    def test_unknown_keys_are_not_cached_or_labelled(self, model_root):
+        manager = ModelManager(str(model_root), max_bytes=10**9, loader=load)
+
+        for i in range(50):
+            with pytest.raises(ModelNotFound):
+                manager.get(f'bogus/{i}')
+
+        assert manager._errors == {} and manager._loading == {}
+        assert REGISTRY.get_sample_value(
+            'spam_detector_model_loads_total', {'model': 'bogus/0', 'outcome': 'not_found'}) is None
+        assert REGISTRY.get_sample_value(
+            'spam_detector_model_loads_total', {'model': 'unknown', 'outcome': 'not_found'}) >= 50
+
+    def test_evicts_least_recently_used_by_size(self, model_root, trained_detector):
+        size = estimate_model_bytes(trained_detector)
+        manager = ModelManager(str(model_root), max_bytes=int(size * 2.5), loader=load)
+
+        manager.get('sms/en')
+        manager.get('sms/fr')
+        manager.get('sms/en')  # sms/fr is now least recently used
+        manager.get('email')
+
+        assert list(manager.resident()) == ['sms/en', 'email']
+        assert manager.resident_bytes <= manager.max_bytes
+
+    def test_concurrent_requests_share_one_load(self, model_root):
+        calls = []
+
+        def slow_load(path):
+            calls.append(path)
+            time.sleep(0.2)
+            return load(path)
+
+        manager = ModelManager(str(model_root), max_bytes=10**9, loader=slow_load)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.get('sms/en'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert len(results) == 8
+        assert all(result is results[0] for result in results)
+
+    def test_predict_routes_on_model_key(self, model_root):
+        import app as app_module
+        manager = ModelManager(str(model_root), max_bytes=10**9, loader=load)
+        client = app_module.app.test_client()
+
+        with patch.object(app_module, 'model_manager', manager):
+            routed = client.post('/api/predict', json={'message': 'WIN FREE MONEY NOW', 'model': 'sms/en'})
+            by_header = client.post('/api/predict', json={'message': 'Lunch at noon'},
+                                    headers={'X-Model-Key': 'email'})
+            unknown = client.post('/api/predict', json={'message': 'hi', 'model': 'sms/de'})
+            invalid = client.post('/api/predict', json={'message': 'hi', 'model': '../model'})
+
+        assert routed.status_code == 200 and routed.get_json()['is_spam']
+        assert by_header.status_code == 200
+        assert list(manager.resident()) == ['sms/en', 'email']
+        assert unknown.status_code == 404
+        assert invalid.status_code == 400
+
+    def test_tenant_models_load_without_campaign_index(self, model_root):
+        import app as app_module
+        tenant = app_module.load_tenant_model(str(model_root / 'email'))
+
+        assert tenant.campaign_index is None
+        assert tenant.prefilter is app_module.prefilter
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from prefilter import MAX_SCAN_CHARS, CompiledRules, RulePrefilter
+
+RULES = {
+    'allow': [{'id': 'internal-newsletter', 'literal': 'acme weekly'}],
+    'deny': [
+        {'id': 'premium-rate-number', 'regex': r'\b09\d{8,9}\b'},
+        {'id': 'claim-code', 'literal': 'claim code'},
+        {'id': 'terms', 'literal': 't&c'},
+    ]
+}
+
+
+@pytest.fixture
+def rules_path(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(RULES))
+    return path
+
+
+class TestPrefilter:
+    """Test cases for the signature prefilter."""
+
+    def test_backreferences_keep_their_own_groups(self):
+        rules = CompiledRules({'deny': [{'id': 'premium-rate-number', 'regex': r'\b09\d{8,9}\b'},
+                                        {'id': 'doubled-word', 'regex': r'\b(\w+) \1\b'}]})
+
+        assert rules.match("win win now") == ('doubled-word', 'deny')
+        assert rules.match("win big now") is None
+
+    def test_only_the_head_is_scanned(self, rules_path):
+        prefilter = RulePrefilter(str(rules_path))
+
+        assert prefilter.scan("claim code " + "x" * MAX_SCAN_CHARS).rule_id == 'claim-code'
+        assert prefilter.scan("x" * MAX_SCAN_CHARS + " claim code") is None
+
+    def test_literal_and_regex_rules(self, rules_path):
+        prefilter = RulePrefilter(str(rules_path))
+
+        assert prefilter.scan("Your CLAIM CODE is KL341").rule_id == 'claim-code'
+        assert prefilter.scan("To claim call 09061701461 now").rule_id == 'premium-rate-number'
+        assert prefilter.scan("See you at lunch") is None
+
+    def test_allow_list_wins(self, rules_path):
+        prefilter = RulePrefilter(str(rules_path))
+
+        hit = prefilter.scan("ACME Weekly: T&C updated")
+
+        assert hit.rule_id == 'internal-newsletter'
+        assert hit.is_spam is False
+
+    def test_allow_regex_wins_over_overlapping_deny_regex(self, tmp_path):
+        with open(os.path.join(os.path.dirname(__file__), '..', 'rules', 'prefilter_rules.json')) as f:
+            shipped = json.load(f)
+        shipped['allow'] = shipped.get('allow', []) + [{'id': 'support-shortcode', 'regex': r'\b87121\b'}]
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(shipped))
+        prefilter = RulePrefilter(str(path))
+
+        hit = prefilter.scan("Text HELP to 87121 for support")
+
+        assert hit.rule_id == 'support-shortcode'
+        assert hit.is_spam is False
+        assert prefilter.scan("Text WIN to 87122 now").rule_id == 'shortcode-call-to-action'
+
+    def test_hot_reload_and_bad_file(self, rules_path):
+        prefilter = RulePrefilter(str(rules_path), reload_interval=0)
+        assert prefilter.scan("free ringtones") is None
+
+        updated = dict(RULES, deny=RULES['deny'] + [{'id': 'ringtones', 'literal': 'ringtones'}])
+        rules_path.write_text(json.dumps(updated))
+        os.utime(rules_path, (1, 1))
+        assert prefilter.scan("free ringtones").rule_id == 'ringtones'
+
+        rules_path.write_text('{"deny": [{"id": "broken", "regex": "("}]}')
+        os.utime(rules_path, (2, 2))
+        assert prefilter.scan("free ringtones").rule_id == 'ringtones'
+
+    def test_detector_short_circuits_rule_hits(self, rules_path, trained_detector):
+        detector = trained_detector
+        detector.prefilter = RulePrefilter(str(rules_path))
+
+        with patch.object(detector, '_score', wraps=detector._score) as score:
+            results = detector.predict(["Claim code KL341", "See you at lunch"])
+
+        assert results[0]['rule_id'] == 'claim-code'
+        assert results[0]['prediction'] == 'Spam'
+        assert 'rule_id' not in results[1]
+        score.assert_called_once_with(["See you at lunch"])
@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from profiling import UNMATCHED, MemoryTracer, ProfilerBusy, RouteTimings, SamplingProfiler, collapsed
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+class TestProfiling:
+    """Test cases for the on-demand profiling hooks."""
+
+    def test_sampling_profiler_sees_busy_thread(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+        worker.start()
+        try:
+            profile = SamplingProfiler(interval=0.001).profile(0.2)
+        finally:
+            stop.set()
+            worker.join()
+
+        assert profile['pid'] == os.getpid()
+        assert profile['samples'] > 10
+        busy = [stack for stack in profile['stacks'] if 'busy_loop' in stack]
+        assert busy and all(stack.startswith('busy-worker;') for stack in busy)
+        line = collapsed(profile).splitlines()[0]
+        assert line.rsplit(' ', 1)[1].isdigit()
+
+    def test_one_profile_at_a_time_and_duration_cap(self):
+        profiler = SamplingProfiler(interval=0.001, max_duration=0.3)
+        result = {}
+        runner = threading.Thread(target=lambda: result.update(profiler.profile(60)))
+        runner.start()
+        time.sleep(0.05)
+        with pytest.raises(ProfilerBusy):
+            profiler.profile(0.1)
+        runner.join(timeout=5)
+
+        assert result['duration'] < 1.0
+
+    def test_memory_tracer_diffs_snapshots(self):
+        tracer = MemoryTracer(frames=1, top=10)
+        assert tracer.start()
+        try:
+            first = tracer.snapshot()
+            retained = [bytearray(1024) for _ in range(2000)]
+            second = tracer.snapshot()
+        finally:
+            assert tracer.stop()
+
+        assert not first['compared_to_previous']
+        assert second['compared_to_previous']
+        assert second['top'][0]['size_diff'] >= 2000 * 1024
+        assert 'test_profiling.py' in second['top'][0]['traceback'][0]
+        assert len(retained) == 2000
+        with pytest.raises(RuntimeError):
+            tracer.snapshot()
+
+    def test_memory_tracing_is_shared_across_workers(self, tmp_path):
+        tracer = MemoryTracer(frames=1, top=5, shared_dir=str(tmp_path), poll_interval=0.05)
+        child = os.fork()
+        if child == 0:
+            # A forked worker: polls the control file from its own thread
+            try:
+                tracer.ensure_polling()
+                time.sleep(10)
+            finally:
+                os._exit(0)
+        try:
+            assert tracer.start()
+            reports = tracer.collect(timeout=5)
+            assert tracer.stop()
+            with pytest.raises(RuntimeError):
+                tracer.collect()
+        finally:
+            os.kill(child, 9)
+            os.waitpid(child, 0)
+
+        assert sorted(report['pid'] for report in reports) == sorted([os.getpid(), child])
+        assert all(report['top'] for report in reports)
+        assert not list(tmp_path.glob('memory_*'))
+
+    def test_route_timings_only_while_enabled(self):
+        timings = RouteTimings()
+        timings.enable()
+        for ms in range(1, 101):
+            timings.record('predict_message', ms / 1000)
+        report = timings.report()
+
+        assert report['routes']['predict_message']['count'] == 100
+        assert report['routes']['predict_message']['max_ms'] == 100.0
+        assert report['routes']['predict_message']['p50_ms'] == pytest.approx(50.5)
+
+    def test_admin_routes_require_token(self):
+        import app as app_module
+        client = app_module.app.test_client()
+
+        with patch.object(app_module, 'ADMIN_TOKEN', None):
+            assert client.get('/admin/profile/routes').status_code == 404
+        with patch.object(app_module, 'ADMIN_TOKEN', 'secret'), \
+                patch.object(app_module, 'route_timings', RouteTimings()):
+            assert client.get('/admin/profile/routes').status_code == 401
+            headers = {'Authorization': 'Bearer secret'}
+            assert client.post('/admin/profile/routes', headers=headers).get_json()['enabled']
+            client.get('/ready')
+            client.get('/wp-login.php')
+            report = client.get('/admin/profile/routes', headers=headers).get_json()
+            client.delete('/admin/profile/routes', headers=headers)
+
+            profile = client.post('/admin/profile/cpu?seconds=0.05', headers={'X-Admin-Token': 'secret'})
+
+        assert report['routes']['readiness_check']['count'] == 1
+        assert report['routes'][UNMATCHED]['count'] == 1
+        assert '/wp-login.php' not in report['routes']
+        assert profile.status_code == 200
+        assert profile.mimetype == 'text/plain'
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model import SpamDetector
+from quantize import QuantizedNB, quantize
+
+TRAIN_CSV = """v1,v2
+ham,See you tomorrow at the office
+spam,WIN FREE MONEY NOW call 09061701461
+ham,How are you doing today
+spam,Claim your FREE prize text WIN to 87121
+ham,Lunch at noon with the team
+spam,URGENT you have won a cash prize claim now
+ham,Can you pick up milk on the way home
+spam,Free entry to win a holiday txt CLAIM now
+"""
+
+
+@pytest.fixture
+def trained(tmp_path):
+    csv_file = tmp_path / "train.csv"
+    csv_file.write_text(TRAIN_CSV)
+    detector = SpamDetector()
+    detector.train(str(csv_file))
+    return detector, str(csv_file)
+
+
+class TestQuantization:
+    """Test cases for reduced-precision model weights."""
+
+    @pytest.mark.parametrize('precision', ['float32', 'float16', 'int8'])
+    def test_quantized_model_tracks_reference(self, trained, precision):
+        detector, _ = trained
+        vectorizer, model = quantize(detector.vectorizer, detector.model, precision)
+        texts = ["claim your free prize now", "see you at lunch"]
+
+        reference = detector.model.predict_proba(detector.vectorizer.transform(texts))
+        quantized = model.predict_proba(vectorizer.transform(texts))
+
+        assert isinstance(model, QuantizedNB)
+        assert np.allclose(reference, quantized, atol=0.02)
+        assert model.nbytes < detector.model.feature_log_prob_.nbytes
+
+    def test_save_and_load_int8(self, trained, tmp_path):
+        detector, csv_path = trained
+        model_dir = tmp_path / "model"
+        detector.save_model(str(model_dir), precision='int8', validation_path=csv_path)
+
+        loaded = SpamDetector()
+        loaded.load_model(str(model_dir))
+        result = loaded.predict("WIN a FREE prize")
+
+        assert detector.quantization_report['agreement'] == 1.0
+        assert isinstance(loaded.model, QuantizedNB)
+        assert loaded.vectorizer.idf_.dtype == np.float32
+        assert result['prediction'] == detector.predict("WIN a FREE prize")['prediction']
+
+    def test_save_refuses_excessive_drift(self, trained, tmp_path):
+        detector, csv_path = trained
+        model_dir = tmp_path / "model"
+
+        with pytest.raises(ValueError, match="rejected"):
+            detector.save_model(str(model_dir), precision='int8', validation_path=csv_path,
+                                max_drift=0.0)
+
+        assert not model_dir.exists()
@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import redis
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from redis_resilience import CLOSED, OPEN, ResilientRedis
+
+
+@pytest.fixture
+def healthy_client():
+    """A ResilientRedis whose underlying client is a mock that answers PING."""
+    with patch('redis_resilience.redis.Redis') as redis_cls:
+        fake = MagicMock()
+        fake.ping.return_value = True
+        redis_cls.return_value = fake
+        client = ResilientRedis('redis://localhost:6379/0', failure_threshold=2, probe_interval=0.01)
+    return client, fake
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestResilientRedis:
+    """Test cases for the Redis circuit breaker."""
+
+    def test_unreachable_redis_starts_open_and_fails_open(self):
+        client = ResilientRedis('redis://127.0.0.1:1/0', probe_interval=60)
+
+        start = time.perf_counter()
+        value = client.get('key')
+
+        assert client.state == OPEN
+        assert value is None
+        assert time.perf_counter() - start < 0.01
+
+    def test_breaker_opens_after_threshold(self, healthy_client):
+        client, fake = healthy_client
+        fake.get.side_effect = redis.TimeoutError("slow")
+        fake.ping.side_effect = redis.TimeoutError("slow")
+
+        assert client.get('a') is None
+        assert client.state == CLOSED
+        assert client.get('b') is None
+        assert client.state != CLOSED
+
+        fake.get.reset_mock()
+        client.get('c')
+        fake.get.assert_not_called()
+
+    def test_background_probe_closes_breaker(self, healthy_client):
+        client, fake = healthy_client
+        fake.incr.side_effect = redis.ConnectionError("down")
+        fake.ping.side_effect = redis.ConnectionError("down")
+        client.incr('a')
+        client.incr('b')
+        assert not client.available
+
+        fake.ping.side_effect = None
+        fake.incr.side_effect = None
+        fake.incr.return_value = 3
+
+        assert _wait_for(lambda: client.available)
+        assert client.incr('c') == 3
+
+    def test_forked_worker_starts_its_own_probe(self):
+        # Opened before the fork, like a master process under preload_app
+        client = ResilientRedis('redis://127.0.0.1:1/0', probe_interval=60)
+        assert client.state == OPEN
+
+        child = os.fork()
+        if child == 0:
+            recovered = False
+            try:
+                client.probe_interval = 0.01
+                client._client = MagicMock(**{'ping.return_value': True})
+                client.get('key')
+                recovered = _wait_for(lambda: client.available)
+            finally:
+                os._exit(0 if recovered else 1)
+        _, status = os.waitpid(child, 0)
+
+        assert os.WEXITSTATUS(status) == 0
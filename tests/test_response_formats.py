@@ -0,0 +1,90 @@
+import gzip
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app
+from response_formats import encode, to_columns
+
+RESULTS = [
+    {'text': 'hello', 'is_spam': False, 'spam_probability': 1.5, 'ham_probability': 98.5,
+     'prediction': 'Not Spam'},
+    {'text': 'WIN NOW', 'is_spam': True, 'spam_probability': 99.0, 'ham_probability': 1.0,
+     'prediction': 'Spam', 'campaign_id': 'c1'},
+]
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+class TestResponseFormats:
+    """Test cases for batch response encodings."""
+
+    def test_columns_fill_missing_fields(self):
+        columns = to_columns(RESULTS, include_text=False)
+
+        assert 'text' not in columns
+        assert columns['prediction'] == ['Not Spam', 'Spam']
+        assert columns['campaign_id'] == [None, 'c1']
+
+    @pytest.mark.parametrize('encoding', [None, 'gzip'])
+    def test_json_and_ndjson_round_trip(self, encoding):
+        for fmt in ('json', 'ndjson'):
+            body = b''.join(encode(RESULTS, fmt, include_text=True, encoding=encoding))
+            if encoding:
+                body = gzip.decompress(body)
+            if fmt == 'json':
+                decoded = json.loads(body)
+            else:
+                decoded = [json.loads(line) for line in body.decode().splitlines()]
+            assert decoded == RESULTS
+
+    def test_msgpack_is_columnar(self):
+        msgpack = pytest.importorskip('msgpack')
+        body = msgpack.unpackb(b''.join(encode(RESULTS, 'msgpack', include_text=False)))
+
+        assert body['count'] == 2
+        assert body['columns']['is_spam'] == [False, True]
+
+    def test_batch_endpoint_negotiates_columnar_gzip(self, client):
+        lines = '\n'.join(f"message number {i} WIN a prize" for i in range(40))
+        response = client.post(
+            '/predict_batch?format=columnar&include_text=false',
+            data={'file': (io.BytesIO(lines.encode()), 'messages.txt')},
+            headers={'Accept-Encoding': 'gzip'})
+
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        body = json.loads(gzip.decompress(response.get_data()))
+        assert body['count'] == 40
+        assert 'text' not in body['columns']
+        assert len(body['columns']['prediction']) == 40
+        assert response.headers['Vary'] == 'Accept, Accept-Encoding'
+
+    def test_negotiated_responses_vary_on_accept(self, client):
+        headers = {'Accept-Encoding': 'gzip'}
+        single = client.post('/api/predict', json={'message': 'WIN a prize'}, headers=headers)
+        ndjson = client.post('/api/predict', json={'message': 'WIN a prize'},
+                             headers=dict(headers, Accept='application/x-ndjson'))
+        small_batch = client.post('/predict_batch', data={'messages_text': 'hi\nWIN a prize'}, headers=headers)
+
+        for response in (single, ndjson, small_batch):
+            assert response.status_code == 200
+            # Too few rows to compress, so only the format varies
+            assert response.headers['Vary'] == 'Accept'
+            assert 'Content-Encoding' not in response.headers
+        assert ndjson.mimetype == 'application/x-ndjson'
+
+    def test_unknown_format_is_rejected(self, client):
+        response = client.post('/api/predict?format=xml', json={'message': 'hi'})
+
+        assert response.status_code == 406
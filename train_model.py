@@ -1,12 +1,18 @@
 # train_model.py
 from model import SpamDetector
+from corpus import ensure_corpus
 import os
 import pandas as pd
 
-def train_model():
+def train_model(precision=None):
     detector = SpamDetector()
+    # float64 (default), float32, float16 or int8; reduced precisions are
+    # validated against the float64 model before saving
+    precision = precision or os.environ.get("MODEL_PRECISION", "float64")
     
     dataset_path = "spam_dataset.csv"
+    feedback_path = "feedback_data.csv"
+    corpus_dir = os.environ.get("CORPUS_DIR", "corpus")
 
     # Create a dummy spam_dataset.csv for testing if it doesn't exist
     if not os.path.exists(dataset_path):
@@ -42,10 +48,15 @@ def train_model():
 
     print("Starting model training...")
     try:
-        accuracy, report = detector.train(dataset_path) # Use the variable
-        detector.save_model() # Saves to "model/model.pkl" and "model/vectorizer.pkl"
+        # Dataset + feedback, normalized and deduplicated; rebuilt only when a source changes
+        corpus = ensure_corpus(dataset_path, feedback_path, corpus_dir)
+        print(f"Training corpus: {len(corpus)} messages, content hash {corpus.content_hash}")
+        accuracy, report = detector.train(corpus.path)
+        detector.save_model(precision=precision, validation_path=dataset_path) # Saves to "model/model.pkl" and "model/vectorizer.pkl"
         
         print(f"Model trained with accuracy: {accuracy}")
+        if detector.quantization_report:
+            print(f"Saved with {precision} weights: {detector.quantization_report}")
         print("Classification Report:")
         print(report)
         print("Model saved successfully in the 'model' directory.")